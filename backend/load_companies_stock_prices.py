@@ -1,6 +1,7 @@
 # pip install yfinance pandas psycopg2-binary python-dotenv
 import os
 import psycopg2
+from psycopg2.extras import execute_values
 import pandas as pd
 import yfinance as yf
 from dotenv import load_dotenv
@@ -112,10 +113,12 @@ def delete_existing_range(cur, companies_id: int, start_dt: pd.Timestamp, end_dt
     )
 
 def insert_prices(cur, companies_id: int, df: pd.DataFrame):
+    # one multi-row INSERT per company: the statement-level triggers on
+    # stock_prices (latest_prices, data_versions) then fire once, not per row
     sql = """
         INSERT INTO stock_prices
             (companies_id, trade_timestamp, open, high, low, close, adj_close, volume)
-        VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
+        VALUES %s
     """
     payload = [
         (
@@ -130,7 +133,7 @@ def insert_prices(cur, companies_id: int, df: pd.DataFrame):
         )
         for ts, r in df.iterrows()
     ]
-    cur.executemany(sql, payload)
+    execute_values(cur, sql, payload, page_size=max(len(payload), 1))
 
 # ---------- MAIN ----------
 def main():
@@ -0,0 +1,207 @@
+# pip install psycopg2-binary python-dotenv
+"""Versioned schema migrations for the stocks database.
+
+Migrations are ``migrations/NNNN_name.sql`` files, applied in order and
+recorded in ``schema_migrations``. A file whose first line is
+``-- migrate: no-transaction`` runs statement by statement in autocommit
+(needed for ``CREATE INDEX CONCURRENTLY``); every other file runs in one
+transaction, together with its data step from ``AFTER_APPLY`` if it has
+one (0004 fills ``user_positions`` from the trade history). Runners take an
+advisory lock, so two containers starting at once do not race.
+
+A failed ``CREATE INDEX CONCURRENTLY`` leaves an INVALID index behind, which
+``IF NOT EXISTS`` would then skip; such leftovers are dropped before the
+migration is retried.
+
+    python migrate.py                 # apply pending migrations
+    python migrate.py --status        # list applied / pending
+    python migrate.py --check-plans   # EXPLAIN the hot queries, fail unless they use their indexes
+"""
+import argparse, json, os, re, sys
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ---------- DB CONFIG ----------
+DB_HOST = os.getenv("DB_HOST")
+DB_PORT = int(os.getenv("DB_PORT")) if os.getenv("DB_PORT") else None
+DB_USER = os.getenv("DB_USER")
+DB_PASS = os.getenv("DB_PASSWORD")
+DB_NAME = os.getenv("DB_NAME")
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MIGRATIONS_DIR = os.path.join(BASE_DIR, "migrations")
+LOCK_KEY = 272_001              # pg_advisory_lock key shared by all runners
+NO_TX_MARKER = "-- migrate: no-transaction"
+
+# ---------- DATA STEPS (run in the same transaction as their migration) ----------
+def _fill_positions(conn, cur):
+    sys.path.insert(0, os.path.join(BASE_DIR, "src"))
+    import positions
+    print(f"  rebuilt {positions.fill(conn, cur)} positions from user_trades")
+
+AFTER_APPLY = {4: _fill_positions}      # version -> fn(conn, cur)
+
+# ---------- HOT QUERIES (query, params, index that must serve it) ----------
+PLAN_CHECKS = [
+    ("companies_id by symbol",
+     "SELECT companies_id FROM companies WHERE symbol=%s", ("AAPL",),
+     "companies_symbol_key"),
+    ("price history (/stocks/prices/<symbol>)",
+     """SELECT trade_timestamp, open, high, low, close, adj_close, volume
+          FROM stock_prices
+         WHERE companies_id=%s AND trade_timestamp >= NOW() - INTERVAL '365 days'
+         ORDER BY trade_timestamp DESC LIMIT 100""", (1,),
+     "stock_prices_company_ts_key"),
+    ("position row (/stocks/sell)",
+     "SELECT quantity FROM user_positions WHERE user_id=%s AND company_id=%s", (1, 1),
+     "user_positions_pkey"),
+    ("trade history page (/user/trades?before=)",
+     """SELECT id FROM user_trades
+         WHERE user_id=%s AND (trade_timestamp, id) < (LOCALTIMESTAMP, 0)
+         ORDER BY trade_timestamp DESC, id DESC LIMIT 51""", (1,),
+     "user_trades_user_ts_id_idx"),
+    ("trade history page for one symbol (/user/trades?symbol=)",
+     """SELECT id FROM user_trades
+         WHERE user_id=%s AND company_id=%s AND (trade_timestamp, id) < (LOCALTIMESTAMP, 0)
+         ORDER BY trade_timestamp DESC, id DESC LIMIT 51""", (1, 1),
+     "user_trades_user_company_ts_id_idx"),
+]
+
+# ---------- HELPERS ----------
+def discover():
+    """[(version, name, path)] sorted by version."""
+    out = []
+    for fn in sorted(os.listdir(MIGRATIONS_DIR)):
+        m = re.match(r"^(\d+)_(\w+)\.sql$", fn)
+        if m:
+            out.append((int(m.group(1)), m.group(2), os.path.join(MIGRATIONS_DIR, fn)))
+    return out
+
+def split_statements(sql: str):
+    """Split on ``;`` at line ends, keeping ``$$ ... $$`` bodies (DO blocks) whole."""
+    stmts, cur, in_dollar = [], [], False
+    for line in sql.splitlines():
+        if not cur and (not line.strip() or line.strip().startswith("--")):
+            continue
+        cur.append(line)
+        if line.count("$$") % 2:
+            in_dollar = not in_dollar
+        if not in_dollar and line.rstrip().endswith(";"):
+            stmts.append("\n".join(cur))
+            cur = []
+    if cur and "\n".join(cur).strip():
+        stmts.append("\n".join(cur))
+    return stmts
+
+def ensure_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version    INT PRIMARY KEY,
+            name       TEXT NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+def applied_versions(cur):
+    cur.execute("SELECT version FROM schema_migrations")
+    return {r[0] for r in cur.fetchall()}
+
+def drop_invalid_indexes(cur, sql: str):
+    names = re.findall(r"INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)", sql, re.I)
+    if not names:
+        return
+    cur.execute("""
+        SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+         WHERE NOT i.indisvalid AND c.relname = ANY(%s)
+    """, (names,))
+    for (name,) in cur.fetchall():
+        print(f"  dropping invalid index {name} left by an earlier failed build")
+        cur.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+
+def apply(conn, version: int, name: str, path: str):
+    with open(path) as f:
+        sql = f.read()
+    print(f"Applying {version:04d}_{name} …")
+    if sql.lstrip().startswith(NO_TX_MARKER):
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cur:
+                drop_invalid_indexes(cur, sql)
+                for stmt in split_statements(sql):
+                    cur.execute(stmt)
+                cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+        finally:
+            conn.autocommit = False
+    else:
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute(sql)
+                if version in AFTER_APPLY:
+                    AFTER_APPLY[version](conn, cur)
+                cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+
+def _index_names(plan, out):
+    if "Index Name" in plan:
+        out.add(plan["Index Name"])
+    for child in plan.get("Plans", []):
+        _index_names(child, out)
+    return out
+
+def check_plans(conn) -> bool:
+    """EXPLAIN each hot query with sequential scans discouraged and check its index is used.
+
+    Dev databases are small enough that the planner would rightly pick a
+    sequential scan, so ``enable_seqscan`` is switched off: the check proves
+    the index exists and matches the query shape, not the planner's choice
+    at today's table size.
+    """
+    ok = True
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute("SET LOCAL enable_seqscan = off")
+            for label, sql, params, index in PLAN_CHECKS:
+                cur.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+                plan = cur.fetchone()[0]
+                plan = (json.loads(plan) if isinstance(plan, str) else plan)[0]["Plan"]
+                used = _index_names(plan, set())
+                passed = index in used
+                ok &= passed
+                print(f"  {'PASS' if passed else 'FAIL'}  {label}: expected {index}, plan uses {sorted(used) or 'no index'}")
+    return ok
+
+# ---------- MAIN ----------
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--status", action="store_true")
+    ap.add_argument("--check-plans", action="store_true")
+    args = ap.parse_args()
+
+    conn = psycopg2.connect(host=DB_HOST, port=DB_PORT, user=DB_USER, password=DB_PASS, dbname=DB_NAME)
+    try:
+        if args.check_plans:
+            sys.exit(0 if check_plans(conn) else 1)
+
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_lock(%s)", (LOCK_KEY,))
+            ensure_table(cur)
+            done = applied_versions(cur)
+        conn.autocommit = False
+
+        pending = [m for m in discover() if m[0] not in done]
+        if args.status:
+            for version, name, _ in discover():
+                print(f"  {'applied' if version in done else 'pending'}  {version:04d}_{name}")
+            return
+        if not pending:
+            print("Schema is up to date.")
+        for version, name, path in pending:
+            apply(conn, version, name, path)
+        print("All done.")
+    finally:
+        conn.close()        # also releases the advisory lock
+
+if __name__ == "__main__":
+    main()
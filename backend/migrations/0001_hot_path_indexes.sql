@@ -0,0 +1,36 @@
+-- migrate: no-transaction
+-- Indexes for the per-symbol price history and the paginated trade history,
+-- plus unique keys on companies.symbol and stock_prices(companies_id,
+-- trade_timestamp). Built CONCURRENTLY so the loaders and the API keep
+-- writing while they build.
+
+-- a unique symbol index cannot be built over duplicates; refuse instead of guessing which row wins
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM companies WHERE symbol IS NOT NULL GROUP BY symbol HAVING COUNT(*) > 1) THEN
+    RAISE EXCEPTION 'companies has duplicate symbols; merge them before running this migration';
+  END IF;
+END $$;
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS companies_symbol_key
+  ON companies (symbol);
+
+-- re-running a loader without its DELETE could leave duplicate bars; keep the newest row
+DELETE FROM stock_prices a
+  USING stock_prices b
+ WHERE a.companies_id = b.companies_id
+   AND a.trade_timestamp = b.trade_timestamp
+   AND a.id < b.id;
+
+-- also serves every "prices for one company in a time range" lookup
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS stock_prices_company_ts_key
+  ON stock_prices (companies_id, trade_timestamp);
+
+-- /user/trades pages by keyset on (trade_timestamp, id), newest first, with an
+-- optional symbol filter; id makes the cursor comparison an index seek
+CREATE INDEX CONCURRENTLY IF NOT EXISTS user_trades_user_ts_id_idx
+  ON user_trades (user_id, trade_timestamp, id);
+
+-- also serves positions.rebuild()
+CREATE INDEX CONCURRENTLY IF NOT EXISTS user_trades_user_company_ts_id_idx
+  ON user_trades (user_id, company_id, trade_timestamp, id);
@@ -0,0 +1,7 @@
+-- Promote the unique indexes from 0001 to named constraints (a catalog-only
+-- change, no rebuild), so loaders can rely on ON CONFLICT against them.
+ALTER TABLE companies
+  ADD CONSTRAINT companies_symbol_key UNIQUE USING INDEX companies_symbol_key;
+
+ALTER TABLE stock_prices
+  ADD CONSTRAINT stock_prices_company_ts_key UNIQUE USING INDEX stock_prices_company_ts_key;
@@ -0,0 +1,90 @@
+-- Newest stock_prices bar per company, so /stocks/prices reads one row per
+-- company instead of a MAX() over the whole history. Statement-level
+-- triggers keep it current for every writer (the loaders, or anything else
+-- inserting bars), with one set-based statement per INSERT/DELETE/UPDATE
+-- rather than work per row.
+CREATE TABLE IF NOT EXISTS latest_prices (
+    companies_id INT PRIMARY KEY REFERENCES companies(companies_id) ON DELETE CASCADE,
+    trade_timestamp TIMESTAMP NOT NULL,
+    open NUMERIC(12,4),
+    high NUMERIC(12,4),
+    low NUMERIC(12,4),
+    close NUMERIC(12,4),
+    adj_close NUMERIC(12,4),
+    volume BIGINT
+);
+
+-- re-read the newest bar of the given companies (uses stock_prices_company_ts_key)
+CREATE OR REPLACE FUNCTION latest_prices_refresh(ids INT[]) RETURNS void LANGUAGE sql AS $$
+    DELETE FROM latest_prices WHERE companies_id = ANY(ids);
+    INSERT INTO latest_prices (companies_id, trade_timestamp, open, high, low, close, adj_close, volume)
+    SELECT sp.companies_id, sp.trade_timestamp, sp.open, sp.high, sp.low, sp.close, sp.adj_close, sp.volume
+      FROM unnest(ids) AS c(id)
+     CROSS JOIN LATERAL (
+            SELECT * FROM stock_prices s
+             WHERE s.companies_id = c.id
+             ORDER BY s.trade_timestamp DESC
+             LIMIT 1
+           ) sp;
+$$;
+
+CREATE OR REPLACE FUNCTION latest_prices_on_insert() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO latest_prices AS lp (companies_id, trade_timestamp, open, high, low, close, adj_close, volume)
+    SELECT DISTINCT ON (companies_id)
+           companies_id, trade_timestamp, open, high, low, close, adj_close, volume
+      FROM new_rows
+     ORDER BY companies_id, trade_timestamp DESC
+    ON CONFLICT (companies_id) DO UPDATE
+       SET trade_timestamp = EXCLUDED.trade_timestamp,
+           open = EXCLUDED.open, high = EXCLUDED.high, low = EXCLUDED.low,
+           close = EXCLUDED.close, adj_close = EXCLUDED.adj_close, volume = EXCLUDED.volume
+     WHERE lp.trade_timestamp <= EXCLUDED.trade_timestamp;
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION latest_prices_on_delete() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM latest_prices_refresh(ARRAY(SELECT DISTINCT companies_id FROM old_rows));
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION latest_prices_on_update() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM latest_prices_refresh(ARRAY(SELECT companies_id FROM old_rows
+                                        UNION SELECT companies_id FROM new_rows));
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION latest_prices_on_truncate() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    DELETE FROM latest_prices;
+    RETURN NULL;
+END $$;
+
+DROP TRIGGER IF EXISTS stock_prices_latest_ins ON stock_prices;
+CREATE TRIGGER stock_prices_latest_ins AFTER INSERT ON stock_prices
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION latest_prices_on_insert();
+
+DROP TRIGGER IF EXISTS stock_prices_latest_del ON stock_prices;
+CREATE TRIGGER stock_prices_latest_del AFTER DELETE ON stock_prices
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION latest_prices_on_delete();
+
+DROP TRIGGER IF EXISTS stock_prices_latest_upd ON stock_prices;
+CREATE TRIGGER stock_prices_latest_upd AFTER UPDATE ON stock_prices
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION latest_prices_on_update();
+
+DROP TRIGGER IF EXISTS stock_prices_latest_trunc ON stock_prices;
+CREATE TRIGGER stock_prices_latest_trunc AFTER TRUNCATE ON stock_prices
+    FOR EACH STATEMENT EXECUTE FUNCTION latest_prices_on_truncate();
+
+-- backfill; CREATE TRIGGER above holds a lock that keeps writers out until this commits
+INSERT INTO latest_prices (companies_id, trade_timestamp, open, high, low, close, adj_close, volume)
+SELECT DISTINCT ON (companies_id)
+       companies_id, trade_timestamp, open, high, low, close, adj_close, volume
+  FROM stock_prices
+ ORDER BY companies_id, trade_timestamp DESC
+ON CONFLICT (companies_id) DO NOTHING;
@@ -0,0 +1,16 @@
+-- Current holdings per user and company, updated in the same transaction as
+-- each trade, so a sell is checked against one row instead of summing the
+-- user's whole trade history. Average-cost method: cost_basis is what the
+-- shares still held cost in total; realized_pnl accumulates sell proceeds
+-- minus the average cost of the shares sold.
+-- migrate.py fills it from existing trades in the same transaction
+-- (positions.fill); python src/positions.py --backfill rebuilds it by hand.
+CREATE TABLE IF NOT EXISTS user_positions (
+  user_id       INT NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+  company_id    INT NOT NULL REFERENCES companies(companies_id) ON DELETE RESTRICT,
+  quantity      NUMERIC(18,6) NOT NULL DEFAULT 0 CHECK (quantity >= 0),
+  cost_basis    NUMERIC(20,4) NOT NULL DEFAULT 0,
+  realized_pnl  NUMERIC(20,4) NOT NULL DEFAULT 0,
+  updated_at    TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (user_id, company_id)
+);
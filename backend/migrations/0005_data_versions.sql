@@ -0,0 +1,36 @@
+-- Version counters for the read-mostly market data. The API derives
+-- ETag / Last-Modified for /stocks/companies and /stocks/prices* from them,
+-- so browsers and the CDN can revalidate without a query. Statement-level
+-- triggers bump them once per writing statement, so an executemany() that
+-- sends one INSERT per row bumps once per row. load_companies_stock_prices.py
+-- therefore inserts each company's bars in one statement (one DELETE and one
+-- INSERT per company). The companies loaders insert a row per statement;
+-- they touch a few dozen rows, and the cache only needs the version to change.
+-- The bump's UPDATE holds the data_versions row lock until the writing
+-- transaction commits. Concurrent writers of the same table wait on each
+-- other there; readers (the API) are never blocked.
+CREATE TABLE IF NOT EXISTS data_versions (
+    name TEXT PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 1,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT clock_timestamp()
+);
+
+INSERT INTO data_versions (name) VALUES ('companies'), ('stock_prices')
+ON CONFLICT (name) DO NOTHING;
+
+-- clock_timestamp(), not NOW(): a loader's transaction can run for minutes
+CREATE OR REPLACE FUNCTION data_versions_bump() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE data_versions
+       SET version = version + 1, updated_at = clock_timestamp()
+     WHERE name = TG_ARGV[0];
+    RETURN NULL;
+END $$;
+
+DROP TRIGGER IF EXISTS companies_data_version ON companies;
+CREATE TRIGGER companies_data_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON companies
+    FOR EACH STATEMENT EXECUTE FUNCTION data_versions_bump('companies');
+
+DROP TRIGGER IF EXISTS stock_prices_data_version ON stock_prices;
+CREATE TRIGGER stock_prices_data_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON stock_prices
+    FOR EACH STATEMENT EXECUTE FUNCTION data_versions_bump('stock_prices');
@@ -0,0 +1,11 @@
+-- Live Finnhub trades, appended in batches by the feed's tick writer
+-- (FEED_PERSIST=1). db_create_script.txt only runs on a fresh volume, so
+-- databases created before the writer existed get the table here.
+CREATE TABLE IF NOT EXISTS intraday_ticks (
+    symbol VARCHAR(300) NOT NULL,
+    trade_timestamp TIMESTAMP NOT NULL,             -- UTC
+    price DOUBLE PRECISION NOT NULL,
+    volume DOUBLE PRECISION
+);
+
+CREATE INDEX IF NOT EXISTS intraday_ticks_symbol_ts ON intraday_ticks (symbol, trade_timestamp);
@@ -1,156 +1,122 @@
-import json, os, time, threading, queue, atexit, signal
-from datetime import datetime, timedelta
-from typing import Dict, Set
+import os, hmac, time, queue, atexit, base64, signal, hashlib
+from datetime import datetime, timedelta, timezone
+from functools import wraps
 from flask import Flask, Response, jsonify, request
+from flask.json.provider import JSONProvider
+from werkzeug.http import is_resource_modified
 from flask_cors import CORS
 from dotenv import load_dotenv
-import websocket  # from websocket-client
 import psycopg2
 import bcrypt
 import jwt
 
+import feed
+from db_pool import ConnectionPool, PoolExhausted
+from companies import CompanyRegistry
+import positions
+from downsample import lttb
+import serialize
+from http_cache import BodyCache, DataVersions, ENCODINGS, MIN_COMPRESS, encode
+from serialize import rows as result_rows
+from columnar import FORMATS as SERIES_FORMATS, bar_columns, pack as pack_columns
+from broadcast import KEEPALIVE, parse_event_id, parse_symbols, sse_frame
+from feed import STREAM_CONFLATE, hub, latest_quotes, snapshot
+
 load_dotenv()
 
-FINNHUB_TOKEN = os.environ.get("FINNHUB_TOKEN", "")
-SYMBOLS = os.environ.get("SYMBOLS", "AAPL,MSFT,GOOGL,TSLA").split(",")
 DB_HOST = os.getenv("DB_HOST")
 DB_PORT = int(os.getenv("DB_PORT")) if os.getenv("DB_PORT") else None
 DB_USER = os.getenv("DB_USER")
 DB_PASS = os.getenv("DB_PASSWORD")
 DB_NAME = os.getenv("DB_NAME")
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))           # per process; 0 = connect per request
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))  # seconds to wait for a free connection
+COMPANIES_TTL = float(os.getenv("COMPANIES_TTL", "300"))    # seconds between symbol -> companies_id reloads
+MARKET_MAX_AGE = int(os.getenv("MARKET_CACHE_MAX_AGE", "60"))           # Cache-Control max-age for market data
+DATA_VERSION_TTL = float(os.getenv("DATA_VERSION_TTL", "5"))            # seconds between data_versions reads
+MARKET_CACHE_MB = int(os.getenv("MARKET_CACHE_MB", "64"))               # per-process cache of encoded bodies
 SECRET_KEY = os.getenv("SECRET_KEY", "change-me")
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")     # enables /admin/* when set
 
-if not FINNHUB_TOKEN:
-    raise RuntimeError("Set FINNHUB_TOKEN in .env")
+class FastJSONProvider(JSONProvider):
+    """jsonify through serialize.dumps; bodies go out as bytes, no str round trip."""
 
-app = Flask(__name__, static_folder='../frontend/static')
-CORS(app)
+    def dumps(self, obj, **kwargs) -> str:
+        return serialize.dumps_text(obj)
 
-# ---- In-memory state ----
-latest_quotes: Dict[str, dict] = {}        # { "AAPL": {"symbol":"AAPL","price":182.31,"ts":1697040000000} }
-_subscribers: Set[queue.Queue] = set()     # each client gets its own Queue
-
-_sub_lock = threading.Lock()
-def _broadcast(obj):
-    dead = []
-    with _sub_lock:
-        for q in list(_subscribers):
-            try:
-                q.put_nowait(obj)
-            except Exception:
-                dead.append(q)
-        for q in dead:
-            _subscribers.discard(q)
-
-def _subscribe():
-    q = queue.Queue(maxsize=1024)
-    with _sub_lock:
-        _subscribers.add(q)
-    return q
-
-def _unsubscribe(q):
-    with _sub_lock:
-        _subscribers.discard(q)
-
-# ---- Finnhub WS client (runs in a thread, reconnects on failure) ----
-class FinnhubThread(threading.Thread):
-    def __init__(self, token: str, symbols):
-        super().__init__(daemon=True)
-        self.token = token
-        self.symbols = [s.strip() for s in symbols if s.strip()]
-        self._stop = threading.Event()
-        self.ws = None
-
-    def run(self):
-        while not self._stop.is_set():
-            try:
-                ws_url = f"wss://ws.finnhub.io?token={self.token}"
-                self.ws = websocket.WebSocketApp(
-                    ws_url,
-                    on_open=self.on_open,
-                    on_message=self.on_message,
-                    on_error=self.on_error,
-                    on_close=self.on_close
-                )
-                self.ws.run_forever(ping_interval=20, ping_timeout=10)  # keepalive
-            except Exception as e:
-                # backoff before reconnect
-                time.sleep(2)
-            time.sleep(2)
-
-    def stop(self):
-        self._stop.set()
-        try:
-            if self.ws:
-                self.ws.close()
-        except Exception:
-            pass
-
-    # ---- WS callbacks ----
-    def on_open(self, ws):
-        for s in self.symbols:
-            ws.send(json.dumps({"type":"subscribe", "symbol": s}))
-        _broadcast({"type":"status","msg":"connected","at":int(time.time()*1000)})
-
-    def on_message(self, ws, message):
-        try:
-            obj = json.loads(message)
-            if obj.get("type") == "trade":
-                for t in obj.get("data", []):
-                    sym = t.get("s")
-                    price = t.get("p")
-                    ts = t.get("t")
-                    if sym and price is not None:
-                        latest_quotes[sym] = {"symbol": sym, "price": price, "ts": ts}
-                        _broadcast({"type":"quote","symbol": sym, "price": price, "ts": ts})
-        except Exception:
-            pass
+    def loads(self, s, **kwargs):
+        return serialize.loads(s)
 
-    def on_error(self, ws, error):
-        _broadcast({"type":"status","msg":"ws_error","detail":str(error), "at":int(time.time()*1000)})
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(serialize.dumps(obj), mimetype="application/json")
 
-    def on_close(self, ws, code, reason):
-        _broadcast({"type":"status","msg":"disconnected","code":code,"reason":str(reason),"at":int(time.time()*1000)})
+app = Flask(__name__, static_folder='../frontend/static')
+app.json = FastJSONProvider(app)
+CORS(app)
 
-ws_thread = FinnhubThread(FINNHUB_TOKEN, SYMBOLS)
-ws_thread.start()
+# live quotes come from the shared Finnhub ingest
+feed.start()
 
 # ---- Flask routes ----
 @app.route('/')
 def index():
     return app.send_static_file('ticker.html')
 
+def _snapshot_response():
+    # cached encoded quote list; a poller that sends back the ETag gets a 304
+    body, etag = snapshot.get()
+    resp = Response(body, mimetype="application/json")
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp.make_conditional(request)
+
 @app.get("/prices/now")
 def prices_now():
     # snapshot for initial render
-    return jsonify(sorted(list(latest_quotes.values()), key=lambda x: x["symbol"]))
+    return _snapshot_response()
 
 @app.get("/prices/stream")
 def prices_stream():
-    client_q = _subscribe()
+    # optional ?symbols=AAPL,TSLA filter; omitted means every symbol
+    symbols = parse_symbols(request.args.get("symbols"))
+    # ?conflate=1 keeps only the newest quote per symbol for slow readers
+    conflate = request.args.get("conflate", "1" if STREAM_CONFLATE else "0") == "1"
+    # EventSource sends Last-Event-ID on reconnect; replay what it missed
+    last_id = parse_event_id(request.headers.get("Last-Event-ID") or request.args.get("lastEventId"))
+    client_q = hub.subscribe(symbols, conflate=conflate, last_event_id=last_id)
 
     def gen():
-        # send an initial snapshot
-        snap = {"type":"snapshot","data": sorted(list(latest_quotes.values()), key=lambda x: x["symbol"])}
-        yield f"data: {json.dumps(snap)}\n\n"
+        if client_q.backlog is not None:
+            yield b"".join(client_q.backlog)
+        elif symbols is None:
+            yield snapshot.sse_frame(client_q.last_id)
+        else:
+            # send an initial snapshot (fresh client, or its last id was evicted)
+            quotes = [q for q in latest_quotes.values() if client_q.wants(q["symbol"])]
+            snap = {"type":"snapshot","data": sorted(quotes, key=lambda x: x["symbol"])}
+            yield sse_frame(snap, client_q.last_id)
 
         # now stream updates; also send keepalives to keep proxies happy
         last_heartbeat = time.time()
         try:
-            while True:
+            # a client that fell too far behind is dropped; ending the response
+            # makes EventSource reconnect instead of idling on keepalives
+            while not client_q.dropped:
                 try:
-                    item = client_q.get(timeout=15)
-                    yield f"data: {json.dumps(item)}\n\n"
+                    # frames are already encoded once by the broadcaster
+                    yield client_q.get(timeout=15)
                 except queue.Empty:
                     # heartbeat comment (SSE allows comments that clients ignore)
-                    yield ": keepalive\n\n"
+                    yield KEEPALIVE
                 # periodic heartbeat to avoid idle disconnects
                 if time.time() - last_heartbeat > 30:
                     last_heartbeat = time.time()
         except GeneratorExit:
             pass
         finally:
-            _unsubscribe(client_q)
+            hub.unsubscribe(client_q)
 
     return Response(gen(), mimetype="text/event-stream", headers={
         "Cache-Control": "no-cache",
@@ -163,11 +129,22 @@ def prices_stream():
 def health():
     return jsonify({
         "status": "ok",
-        "symbols": SYMBOLS,
+        "symbols": feed.symbols(),
         "live_count": len(latest_quotes),
-        "keys": list(latest_quotes.keys())
+        "keys": list(latest_quotes.keys()),
+        "stream": hub.stats(),
+        "candles": feed.candles.stats(),
+        "snapshot": snapshot.stats(),
+        "db_pool": db_pool.stats() if db_pool else None,
+        "companies": companies.stats(),
+        "http_cache": {**market_cache.stats(), **data_versions.stats()},
+        "tick_writer": feed.writer.stats() if feed.writer else None
     })
 
+@app.get("/metrics")
+def metrics():
+    return jsonify(feed.metrics_report())
+
 @app.get("/stocks/quote/<symbol>")
 def get_live_quote(symbol: str):
     sym = symbol.upper().strip()
@@ -178,7 +155,62 @@ def get_live_quote(symbol: str):
 
 @app.get("/stocks/quotes")
 def list_live_quotes():
-    return jsonify(sorted(list(latest_quotes.values()), key=lambda x: x["symbol"]))
+    return _snapshot_response()
+
+@app.get("/stocks/candles/<symbol>")
+def get_live_candles(symbol: str):
+    """Recent live OHLCV bars: ?interval=1s|1m|5m (see CANDLE_BARS), ?limit=300, ?since=<ms>,
+    ?format=rows|columnar|binary."""
+    sym = symbol.upper().strip()
+    interval = request.args.get("interval", "1m")
+    fmt = request.args.get("format", "rows")
+    if fmt not in SERIES_FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(SERIES_FORMATS)}"}), 400
+    try:
+        limit = int(request.args.get("limit", 300))
+        since = int(request.args["since"]) if request.args.get("since") else None
+        if fmt == "rows":
+            bars = feed.candles.bars(sym, interval, limit, since)
+        else:
+            bars = feed.candles.columns(sym, interval, limit, since)
+    except ValueError:
+        return jsonify({"error": "limit and since must be integers"}), 400
+    except KeyError:
+        return jsonify({"error": "unknown_interval", "intervals": list(feed.candles.intervals)}), 400
+    if fmt == "binary":
+        return _binary_response(bars, ints=("t",))
+    if fmt == "columnar":
+        return jsonify({"symbol": sym, "interval": interval, **bars})
+    return jsonify({"symbol": sym, "interval": interval, "bars": bars})
+
+# ---- Feed Admin ----
+def _admin_ok():
+    token = request.headers.get("X-Admin-Token", "")
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token, ADMIN_TOKEN)
+
+@app.route("/admin/feed/symbols", methods=["GET", "POST", "DELETE"])
+def admin_feed_symbols():
+    if not _admin_ok():
+        return jsonify({"error": "unauthorized"}), 401
+    if request.method != "GET":
+        data = request.get_json(silent=True) or {}
+        syms = data.get("symbols")
+        if not isinstance(syms, list) or not all(isinstance(s, str) for s in syms):
+            return jsonify({"error": "symbols must be a list of strings"}), 400
+        if request.method == "POST":
+            changed = feed.add_symbols(syms)
+        else:
+            changed = feed.remove_symbols(syms)
+        return jsonify({"changed": changed, "symbols": feed.symbols()})
+    return jsonify({"role": feed.role(), "symbols": feed.symbols(), "shards": feed.shard_info()})
+
+@app.post("/admin/companies/invalidate")
+def admin_invalidate_companies():
+    # call after loading new companies to make them tradable right away
+    if not _admin_ok():
+        return jsonify({"error": "unauthorized"}), 401
+    companies.invalidate()
+    return jsonify({"message": "invalidated"})
 
 @app.route('/ticker')
 @app.route('/ticker.html')
@@ -189,9 +221,73 @@ def serve_ticker():
 def serve_static(path):
     return app.send_static_file(path)
 
-def _db_conn():
+def _connect():
     return psycopg2.connect(host=DB_HOST, port=DB_PORT, user=DB_USER, password=DB_PASS, dbname=DB_NAME)
 
+db_pool = ConnectionPool(_connect, DB_POOL_MIN, DB_POOL_MAX, DB_POOL_TIMEOUT) if DB_POOL_MAX > 0 else None
+if db_pool:
+    try:
+        db_pool.warm()
+    except psycopg2.Error:
+        pass    # database not up yet; connections open on first use
+
+def _db_conn():
+    # pooled: conn.close() in the handlers returns the connection to the pool
+    return db_pool.getconn() if db_pool else _connect()
+
+# NUMERIC columns as Postgres' own text, for read-only handlers that pass them
+# straight to JSON: the same strings jsonify made of Decimal, without the Decimal
+NUMERIC_AS_TEXT = psycopg2.extensions.new_type(psycopg2.extensions.DECIMAL.values, "NUMERIC_AS_TEXT",
+                                               lambda value, cur: value)
+
+def _text_numerics(cur):
+    psycopg2.extensions.register_type(NUMERIC_AS_TEXT, cur)     # this cursor only
+    return cur
+
+def _load_company_ids():
+    conn = _db_conn()
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT symbol, companies_id FROM companies WHERE symbol IS NOT NULL")
+                return dict(cur.fetchall())
+    finally:
+        conn.close()
+
+# symbol -> companies_id for the trade and price endpoints, kept in memory
+companies = CompanyRegistry(_load_company_ids, ttl=COMPANIES_TTL)
+
+def _company_id(symbol: str):
+    """companies_id for ``symbol`` (None if unknown), or a 503 response if the registry cannot load.
+
+    Call it before the handler checks out its own connection: a cold registry
+    loads through a pooled connection of its own. PoolExhausted is left to
+    its 503 handler.
+    """
+    try:
+        return companies.id_for(symbol)
+    except PoolExhausted:
+        raise
+    except Exception as e:
+        return jsonify({"error": "db_unavailable", "detail": str(e)}), 503, {"Retry-After": "1"}
+
+def _load_data_versions():
+    conn = _db_conn()
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT name, version, updated_at FROM data_versions")
+                return {name: (version, updated_at) for name, version, updated_at in cur.fetchall()}
+    finally:
+        conn.close()
+
+data_versions = DataVersions(_load_data_versions, ttl=DATA_VERSION_TTL)
+market_cache = BodyCache(MARKET_CACHE_MB << 20)
+
+@app.errorhandler(PoolExhausted)
+def _db_busy(e):
+    return jsonify({"error": "db_busy", "detail": str(e)}), 503, {"Retry-After": "1"}
+
 def _make_token(user_id: int, email: str):
     payload = {"sub": user_id, "email": email, "exp": datetime.utcnow() + timedelta(hours=12)}
     return jwt.encode(payload, SECRET_KEY, algorithm="HS256")
@@ -338,25 +434,15 @@ def get_balances():
             with conn.cursor() as cur:
                 cur.execute(
                     """
-                    SELECT id, user_id, currency, available_balance, total_balance, updated_at
+                    SELECT id, user_id, currency, available_balance::float8 AS available_balance,
+                           total_balance::float8 AS total_balance, updated_at
                     FROM user_balances
                     WHERE user_id=%s
                     ORDER BY updated_at DESC
                     """,
                     (user_id,)
                 )
-                rows = cur.fetchall()
-                balances = [
-                    {
-                        "id": row[0],
-                        "user_id": row[1],
-                        "currency": row[2],
-                        "available_balance": float(row[3]),
-                        "total_balance": float(row[4]),
-                        "updated_at": row[5].isoformat() if row[5] else None,
-                    }
-                    for row in rows
-                ]
+                balances = result_rows(cur)
         return jsonify(balances)
     finally:
         conn.close()
@@ -388,21 +474,14 @@ def create_balance():
                     SET available_balance = EXCLUDED.available_balance,
                         total_balance = EXCLUDED.total_balance,
                         updated_at = CURRENT_TIMESTAMP
-                    RETURNING id, user_id, currency, available_balance, total_balance, updated_at
+                    RETURNING id, user_id, currency, available_balance::float8 AS available_balance,
+                              total_balance::float8 AS total_balance, updated_at
                     """,
                     (user_id, currency, available_balance, total_balance)
                 )
-                row = cur.fetchone()
-                balance_id, user_id, currency, avail, total, updated = row
+                balance = result_rows(cur)[0]
         
-        return jsonify({
-            "id": balance_id,
-            "user_id": user_id,
-            "currency": currency,
-            "available_balance": float(avail),
-            "total_balance": float(total),
-            "updated_at": updated.isoformat() if updated else None,
-        }), 201
+        return jsonify(balance), 201
     finally:
         conn.close()
 
@@ -431,46 +510,111 @@ def delete_balance(balance_id):
         conn.close()
 
 # ---- User Trades Management ----
+TRADES_PAGE_DEFAULT = 50
+TRADES_PAGE_MAX = 500
+
+def _trade_cursor(ts, trade_id) -> str:
+    # opaque to clients; encodes the (trade_timestamp, id) keyset position
+    return base64.urlsafe_b64encode(f"{ts.isoformat()}|{trade_id}".encode()).decode().rstrip("=")
+
+def _parse_trade_cursor(raw: str):
+    raw += "=" * (-len(raw) % 4)
+    ts, trade_id = base64.urlsafe_b64decode(raw.encode()).decode().split("|")
+    return datetime.fromisoformat(ts), int(trade_id)
+
 @app.get("/user/trades")
 def get_trades():
+    """Trade history, newest first, one page at a time.
+
+    Query params: limit (default 50, max 500), before=<cursor> for older
+    trades, after=<cursor> for newer ones, symbol, type=BUY|SELL, and
+    from/to ISO dates. Pages are keyset reads on (trade_timestamp, id), so a
+    page costs the same however long the history is.
+    """
     payload = _parse_token(request.headers.get("Authorization"))
     if not payload:
         return jsonify({"error": "unauthorized"}), 401
     user_id = payload.get("sub")
     
+    limit = max(1, min(request.args.get("limit", TRADES_PAGE_DEFAULT, type=int), TRADES_PAGE_MAX))
+    before, after = request.args.get("before"), request.args.get("after")
+    if before and after:
+        return jsonify({"error": "use either before or after"}), 400
+    
+    where, params = ["ut.user_id=%s"], [user_id]
+    try:
+        if before or after:
+            where.append("(ut.trade_timestamp, ut.id) < (%s, %s)" if before else "(ut.trade_timestamp, ut.id) > (%s, %s)")
+            params.extend(_parse_trade_cursor(before or after))
+        if request.args.get("from"):
+            where.append("ut.trade_timestamp >= %s")
+            params.append(datetime.fromisoformat(request.args["from"]))
+        if request.args.get("to"):
+            where.append("ut.trade_timestamp < %s")
+            params.append(datetime.fromisoformat(request.args["to"]))
+    except ValueError:
+        return jsonify({"error": "invalid cursor or date"}), 400
+    trade_type = (request.args.get("type") or "").upper()
+    if trade_type:
+        if trade_type not in ("BUY", "SELL"):
+            return jsonify({"error": "type must be BUY or SELL"}), 400
+        where.append("ut.trade_type=%s")
+        params.append(trade_type)
+    symbol = (request.args.get("symbol") or "").strip().upper()
+    if symbol:
+        company_id = _company_id(symbol)
+        if isinstance(company_id, tuple):
+            return company_id
+        if company_id is None:
+            return jsonify({"error": "symbol_not_found"}), 404
+        where.append("ut.company_id=%s")
+        params.append(company_id)
+    
+    # walk the index backwards for older pages, forwards for newer ones
+    order = "ASC" if after else "DESC"
     conn = _db_conn()
     try:
         with conn:
             with conn.cursor() as cur:
                 cur.execute(
-                    """
-                    SELECT ut.id, ut.user_id, ut.company_id, ut.trade_type, ut.quantity, 
-                           ut.price, ut.total_price, ut.trade_timestamp, c.symbol
+                    f"""
+                    SELECT ut.id, ut.user_id, ut.company_id, ut.trade_type, ut.quantity::float8 AS quantity,
+                           ut.price::float8 AS price, ut.total_price::float8 AS total_price,
+                           ut.trade_timestamp, c.symbol
                     FROM user_trades ut
                     LEFT JOIN companies c ON ut.company_id = c.companies_id
-                    WHERE ut.user_id=%s
-                    ORDER BY ut.trade_timestamp DESC
+                    WHERE {" AND ".join(where)}
+                    ORDER BY ut.trade_timestamp {order}, ut.id {order}
+                    LIMIT %s
                     """,
-                    (user_id,)
+                    (*params, limit + 1)
                 )
-                rows = cur.fetchall()
-                trades = [
-                    {
-                        "id": row[0],
-                        "user_id": row[1],
-                        "company_id": row[2],
-                        "trade_type": row[3],
-                        "quantity": float(row[4]),
-                        "price": float(row[5]),
-                        "total_price": float(row[6]),
-                        "trade_timestamp": row[7].isoformat() if row[7] else None,
-                        "symbol": row[8],
-                    }
-                    for row in rows
-                ]
-        return jsonify(trades)
+                trades = result_rows(cur)
     finally:
         conn.close()
+    
+    more = len(trades) > limit
+    trades = trades[:limit]
+    if after:
+        trades.reverse()
+    first, last = (trades[0], trades[-1]) if trades else (None, None)
+    # walking backwards, an extra row means older trades exist and a cursor
+    # means newer ones do; walking forwards (after=) it is the other way round
+    older = more if not after else bool(trades)
+    newer = more if after else bool(before and trades)
+    if trades:
+        prev_cursor = _trade_cursor(first["trade_timestamp"], first["id"]) if newer else None
+        next_cursor = _trade_cursor(last["trade_timestamp"], last["id"]) if older else None
+    else:
+        # nothing past the cursor (yet): hand it back so the client can poll from the same
+        # place; behind an after= cursor the older trades are still there to page through
+        prev_cursor = after or before
+        next_cursor = after
+    return jsonify({
+        "trades": trades,
+        "next_cursor": next_cursor,
+        "prev_cursor": prev_cursor,
+    })
 
 @app.delete("/user/trades/<int:trade_id>")
 def delete_trade(trade_id):
@@ -484,90 +628,301 @@ def delete_trade(trade_id):
         with conn:
             with conn.cursor() as cur:
                 # Verify ownership
-                cur.execute("SELECT user_id FROM user_trades WHERE id=%s", (trade_id,))
+                cur.execute("SELECT user_id, company_id FROM user_trades WHERE id=%s", (trade_id,))
                 row = cur.fetchone()
                 if not row or row[0] != user_id:
                     return jsonify({"error": "not_found"}), 404
                 
-                # Delete
+                # Delete, then recompute the position from the remaining history
                 cur.execute("DELETE FROM user_trades WHERE id=%s", (trade_id,))
+                positions.rebuild(cur, user_id, row[1])
         
         return jsonify({"message": "deleted"}), 200
     finally:
         conn.close()
 
+# ---- User Positions ----
+@app.get("/user/positions")
+def get_positions():
+    """Current holdings with average cost, realized P&L and, when priced, unrealized P&L."""
+    payload = _parse_token(request.headers.get("Authorization"))
+    if not payload:
+        return jsonify({"error": "unauthorized"}), 401
+    user_id = payload.get("sub")
+    
+    conn = _db_conn()
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT c.symbol, p.company_id, p.quantity::float8 AS quantity,
+                           p.cost_basis::float8 AS cost_basis, p.realized_pnl::float8 AS realized_pnl,
+                           p.updated_at, lp.close::float8 AS close
+                    FROM user_positions p
+                    JOIN companies c ON c.companies_id = p.company_id
+                    LEFT JOIN latest_prices lp ON lp.companies_id = p.company_id
+                    WHERE p.user_id=%s
+                    ORDER BY c.symbol
+                """, (user_id,))
+                data = result_rows(cur)
+        
+        for p in data:
+            qty, cost, close = p["quantity"], p["cost_basis"], p.pop("close")
+            # prefer the live quote, fall back to the last daily close
+            live = latest_quotes.get(p["symbol"])
+            price = live["price"] if live else close
+            p.update(avg_cost=cost / qty if qty else None,
+                     market_price=price,
+                     market_value=qty * price if price is not None else None,
+                     unrealized_pnl=qty * price - cost if price is not None else None)
+        return jsonify({"positions": data})
+    finally:
+        conn.close()
+
 # ---- Stock Data Endpoints ----
+def market_data(*tables):
+    """Cache headers, 304s and compression for a public GET that only reads ``tables``.
+
+    The weak ETag hashes the full URL, the versions of ``tables`` in
+    ``data_versions`` and the current UTC date (``days=`` windows slide at
+    midnight). 200 bodies are compressed per Accept-Encoding and kept in
+    ``market_cache`` under that ETag, and a matching If-None-Match /
+    If-Modified-Since gets a 304 only once this URL has produced a 200 for
+    it, so bad parameters and unknown symbols still get their 400/404.
+    Without ``data_versions`` (migration 0005 not applied, database down)
+    the handler runs as if undecorated.
+    """
+    def wrap(fn):
+        @wraps(fn)
+        def handler(*args, **kwargs):
+            versions = data_versions.get()
+            if not versions or any(t not in versions for t in tables):
+                return fn(*args, **kwargs)
+            now = datetime.now(timezone.utc)
+            today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+            etag = hashlib.blake2b("|".join([request.full_path, today.date().isoformat(),
+                                             *(f"{t}.{versions[t][0]}" for t in tables)]).encode(),
+                                   digest_size=12).hexdigest()
+            modified = max(today, *(versions[t][1] for t in tables))
+            encoding = request.accept_encodings.best_match(ENCODINGS)
+            key = (etag, encoding)
+            hit = market_cache.get(key)
+            if hit is None:
+                resp = app.make_response(fn(*args, **kwargs))
+                if resp.status_code != 200:
+                    return resp
+                body = resp.get_data()
+                if len(body) < MIN_COMPRESS:
+                    encoding = None
+                hit = (encode(body, encoding), resp.mimetype, encoding)
+                market_cache.put(key, *hit)
+            if not is_resource_modified(request.environ, etag=etag, last_modified=modified):
+                resp = Response(status=304)
+            else:
+                body, mimetype, encoding = hit
+                resp = Response(body, mimetype=mimetype)
+                if encoding:
+                    resp.content_encoding = encoding
+            resp.set_etag(etag, weak=True)
+            resp.last_modified = modified
+            resp.cache_control.public = True
+            resp.cache_control.max_age = MARKET_MAX_AGE
+            resp.vary.add("Accept-Encoding")
+            return resp
+        return handler
+    return wrap
+
 @app.get("/stocks/companies")
+@market_data("companies")
 def get_companies():
     """Return list of all companies with their basic info."""
     conn = _db_conn()
     try:
         with conn:
-            with conn.cursor() as cur:
+            with _text_numerics(conn.cursor()) as cur:
                 cur.execute("""
                     SELECT companies_id, symbol, longName, sector, industry, country, marketCap
                     FROM companies
                     ORDER BY symbol
                 """)
-                cols = [desc[0] for desc in cur.description]
-                rows = cur.fetchall()
-                companies = [dict(zip(cols, row)) for row in rows]
+                companies = result_rows(cur)
         return jsonify(companies)
     finally:
         conn.close()
 
+PRICE_INTERVALS = {"1d": None, "1w": "week", "1mo": "month"}     # interval -> date_trunc unit
+PRICE_BATCH_MAX = 50
+PRICE_POINTS_MIN, PRICE_POINTS_MAX = 3, 5000       # LTTB keeps the first and last bar plus at least one
+
+def _bars_sql(unit, company: str = "%s") -> str:
+    """SELECT for one company's bars, newest first.
+
+    Params: (unit if rolling up), companies_id unless ``company`` is a column, days, limit.
+    """
+    if unit is None:
+        return f"""
+            SELECT trade_timestamp, open, high, low, close, adj_close, volume
+            FROM stock_prices
+            WHERE companies_id={company}
+              AND trade_timestamp >= NOW() - INTERVAL '%s days'
+            ORDER BY trade_timestamp DESC
+            LIMIT %s
+        """
+    # Roll daily bars up into weeks/months: first open, last close
+    return f"""
+        SELECT date_trunc(%s, trade_timestamp) AS trade_timestamp,
+               (array_agg(open ORDER BY trade_timestamp))[1] AS open,
+               MAX(high) AS high, MIN(low) AS low,
+               (array_agg(close ORDER BY trade_timestamp DESC))[1] AS close,
+               (array_agg(adj_close ORDER BY trade_timestamp DESC))[1] AS adj_close,
+               SUM(volume)::bigint AS volume
+        FROM stock_prices
+        WHERE companies_id={company}
+          AND trade_timestamp >= NOW() - INTERVAL '%s days'
+        GROUP BY 1
+        ORDER BY 1 DESC
+        LIMIT %s
+    """
+
+def _price_args():
+    """(interval, points, limit, days, format) from the query string, or a 400 response."""
+    interval = request.args.get("interval", "1d")
+    if interval not in PRICE_INTERVALS:
+        return jsonify({"error": f"interval must be one of {', '.join(PRICE_INTERVALS)}"}), 400
+    fmt = request.args.get("format", "rows")
+    if fmt not in SERIES_FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(SERIES_FORMATS)}"}), 400
+    points = None
+    if "points" in request.args:
+        points = request.args.get("points", type=int)
+        if points is None or not PRICE_POINTS_MIN <= points <= PRICE_POINTS_MAX:
+            return jsonify({"error": f"points must be an integer from {PRICE_POINTS_MIN} to {PRICE_POINTS_MAX}"}), 400
+    limit = request.args.get("limit", None if points else 100, type=int)
+    days = request.args.get("days", 365, type=int)
+    return interval, points, limit, days, fmt
+
+def _downsample_bars(rows, points: int):
+    """Keep ~points of the (newest-first) bars, chosen by LTTB on the close."""
+    rows = [r for r in rows if r[0] is not None and r[4] is not None][::-1]
+    keep = lttb([r[0].timestamp() for r in rows], [float(r[4]) for r in rows], points)
+    return [rows[i] for i in reversed(keep)]
+
+def _bars_out(cols, rows, points, fmt):
+    """Newest-first bar dicts, or oldest-first columns for format=columnar|binary."""
+    if points and len(rows) > points:
+        rows = _downsample_bars(rows, points)
+    if fmt == "rows":
+        return [dict(zip(cols, row)) for row in rows]
+    return bar_columns(rows)
+
+def _binary_response(columns, ints=("t", "v")):
+    return Response(pack_columns(columns, ints), mimetype="application/octet-stream")
+
 @app.get("/stocks/prices/<symbol>")
+@market_data("companies", "stock_prices")
 def get_stock_prices(symbol):
     """
     Get historical stock prices for a symbol.
-    Optional query params: limit (default 100), days (default 365)
+    Optional query params: limit (default 100, or no limit with points), days (default 365),
+    interval (1d|1w|1mo, bars rolled up in SQL), points (downsample to about N bars with LTTB),
+    format (rows, or columnar/binary: one array per field, oldest first)
     """
-    limit = request.args.get("limit", 100, type=int)
-    days = request.args.get("days", 365, type=int)
+    args = _price_args()
+    if isinstance(args[0], Response):
+        return args
+    interval, points, limit, days, fmt = args
+    
+    company_id = _company_id(symbol.upper())
+    if isinstance(company_id, tuple):
+        return company_id
+    if company_id is None:
+        return jsonify({"error": "symbol_not_found"}), 404
     
+    unit = PRICE_INTERVALS[interval]
     conn = _db_conn()
     try:
         with conn:
-            with conn.cursor() as cur:
-                # Get company_id from symbol
-                cur.execute("SELECT companies_id FROM companies WHERE symbol=%s", (symbol.upper(),))
-                row = cur.fetchone()
-                if not row:
-                    return jsonify({"error": "symbol_not_found"}), 404
-                company_id = row[0]
-                
-                # Fetch recent prices
-                cur.execute("""
-                    SELECT trade_timestamp, open, high, low, close, adj_close, volume
-                    FROM stock_prices
-                    WHERE companies_id=%s
-                      AND trade_timestamp >= NOW() - INTERVAL '%s days'
-                    ORDER BY trade_timestamp DESC
-                    LIMIT %s
-                """, (company_id, days, limit))
-                
+            with _text_numerics(conn.cursor()) as cur:
+                cur.execute(_bars_sql(unit), (*([unit] if unit else []), company_id, days, limit))
                 cols = [desc[0] for desc in cur.description]
-                rows = cur.fetchall()
-                prices = [dict(zip(cols, row)) for row in rows]
-                
-                # Convert timestamps to ISO format strings for JSON serialization
-                for p in prices:
-                    if p.get('trade_timestamp'):
-                        p['trade_timestamp'] = p['trade_timestamp'].isoformat()
+                prices = _bars_out(cols, cur.fetchall(), points, fmt)
                 
-        return jsonify({"symbol": symbol.upper(), "prices": prices})
+        if fmt == "binary":
+            return _binary_response(prices)
+        if fmt == "columnar":
+            return jsonify({"symbol": symbol.upper(), "interval": interval, **prices})
+        return jsonify({"symbol": symbol.upper(), "interval": interval, "prices": prices})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        conn.close()
+
+@app.get("/stocks/prices/batch")
+@market_data("companies", "stock_prices")
+def get_stock_prices_batch():
+    """
+    Price history for several symbols in one query: symbols=AAPL,MSFT,...
+    Takes the same days/limit/interval/points as /stocks/prices/<symbol>; limit and points are per symbol.
+    format=columnar gives each symbol its columns; binary is single-series only.
+    """
+    args = _price_args()
+    if isinstance(args[0], Response):
+        return args
+    interval, points, limit, days, fmt = args
+    if fmt == "binary":
+        return jsonify({"error": "format=binary is only supported for a single symbol"}), 400
+    symbols = parse_symbols(request.args.get("symbols"))
+    if not symbols:
+        return jsonify({"error": "symbols required"}), 400
+    if len(symbols) > PRICE_BATCH_MAX:
+        return jsonify({"error": f"at most {PRICE_BATCH_MAX} symbols"}), 400
+    
+    ids = {}
+    for sym in sorted(symbols):
+        company_id = _company_id(sym)
+        if isinstance(company_id, tuple):
+            return company_id
+        if company_id is not None:
+            ids[company_id] = sym
+    missing = sorted(symbols - set(ids.values()))
+    prices = {sym: _bars_out(None, [], None, fmt) for sym in ids.values()}
+    if not ids:
+        return jsonify({"interval": interval, "prices": prices, "missing": missing})
+    
+    unit = PRICE_INTERVALS[interval]
+    conn = _db_conn()
+    try:
+        with conn:
+            with _text_numerics(conn.cursor()) as cur:
+                # one index range scan per company, all in a single round trip
+                cur.execute(f"""
+                    SELECT c.id, b.*
+                    FROM unnest(%s::int[]) AS c(id)
+                    CROSS JOIN LATERAL ({_bars_sql(unit, company="c.id")}) b
+                    ORDER BY c.id, b.trade_timestamp DESC
+                """, (list(ids), *([unit] if unit else []), days, limit))
+                cols = [desc[0] for desc in cur.description][1:]
+                rows = cur.fetchall()
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     finally:
         conn.close()
+    
+    by_company = {}
+    for row in rows:
+        by_company.setdefault(row[0], []).append(row[1:])
+    for company_id, bars in by_company.items():
+        prices[ids[company_id]] = _bars_out(cols, bars, points, fmt)
+    return jsonify({"interval": interval, "prices": prices, "missing": missing})
 
 @app.get("/stocks/prices")
+@market_data("companies", "stock_prices")
 def get_all_latest_prices():
-    """Get the latest price for each company."""
+    """Get the latest price for each company (latest_prices is kept current by triggers on stock_prices)."""
     conn = _db_conn()
     try:
         with conn:
-            with conn.cursor() as cur:
+            with _text_numerics(conn.cursor()) as cur:
                 cur.execute("""
                     SELECT 
                         c.symbol, 
@@ -575,26 +930,10 @@ def get_all_latest_prices():
                         sp.trade_timestamp,
                         sp.open, sp.high, sp.low, sp.close, sp.adj_close, sp.volume
                     FROM companies c
-                    LEFT JOIN (
-                        SELECT companies_id, trade_timestamp, open, high, low, close, adj_close, volume
-                        FROM stock_prices
-                        WHERE (companies_id, trade_timestamp) IN (
-                            SELECT companies_id, MAX(trade_timestamp)
-                            FROM stock_prices
-                            GROUP BY companies_id
-                        )
-                    ) sp ON c.companies_id = sp.companies_id
+                    LEFT JOIN latest_prices sp ON c.companies_id = sp.companies_id
                     ORDER BY c.symbol
                 """)
-                
-                cols = [desc[0] for desc in cur.description]
-                rows = cur.fetchall()
-                data = []
-                for row in rows:
-                    d = dict(zip(cols, row))
-                    if d.get('trade_timestamp'):
-                        d['trade_timestamp'] = d['trade_timestamp'].isoformat()
-                    data.append(d)
+                data = result_rows(cur)
                 
         return jsonify(data)
     except Exception as e:
@@ -621,17 +960,16 @@ def buy_stock():
     
     total_cost = quantity * price
     
+    company_id = _company_id(symbol)
+    if isinstance(company_id, tuple):
+        return company_id
+    if company_id is None:
+        return jsonify({"error": "symbol_not_found"}), 404
+    
     conn = _db_conn()
     try:
         with conn:
             with conn.cursor() as cur:
-                # Get company_id from symbol
-                cur.execute("SELECT companies_id FROM companies WHERE symbol=%s", (symbol,))
-                row = cur.fetchone()
-                if not row:
-                    return jsonify({"error": "symbol_not_found"}), 404
-                company_id = row[0]
-                
                 # Check user balance
                 cur.execute("SELECT available_balance FROM user_balances WHERE user_id=%s AND currency='USD'", (user_id,))
                 balance_row = cur.fetchone()
@@ -649,6 +987,8 @@ def buy_stock():
                     RETURNING id
                 """, (user_id, company_id, "BUY", quantity, price, total_cost))
                 trade_id = cur.fetchone()[0]
+                cur.execute(positions.APPLY_BUY, {"user_id": user_id, "company_id": company_id,
+                                                  "quantity": quantity, "total": total_cost})
                 
                 # Update balance
                 cur.execute("""
@@ -682,23 +1022,18 @@ def sell_stock():
     
     total_proceeds = quantity * price
     
+    company_id = _company_id(symbol)
+    if isinstance(company_id, tuple):
+        return company_id
+    if company_id is None:
+        return jsonify({"error": "symbol_not_found"}), 404
+    
     conn = _db_conn()
     try:
         with conn:
             with conn.cursor() as cur:
-                # Get company_id from symbol
-                cur.execute("SELECT companies_id FROM companies WHERE symbol=%s", (symbol,))
-                row = cur.fetchone()
-                if not row:
-                    return jsonify({"error": "symbol_not_found"}), 404
-                company_id = row[0]
-                
-                # Check user has enough shares (sum of BUY - SELL for this company)
-                cur.execute("""
-                    SELECT COALESCE(SUM(CASE WHEN trade_type='BUY' THEN quantity ELSE -quantity END), 0)
-                    FROM user_trades
-                    WHERE user_id=%s AND company_id=%s
-                """, (user_id, company_id))
+                # Check user has enough shares (one locked row in user_positions)
+                cur.execute(positions.SELECT_FOR_SELL, (user_id, company_id))
                 shares_row = cur.fetchone()
                 available_shares = int(shares_row[0]) if shares_row else 0
                 
@@ -712,6 +1047,8 @@ def sell_stock():
                     RETURNING id
                 """, (user_id, company_id, "SELL", quantity, price, total_proceeds))
                 trade_id = cur.fetchone()[0]
+                cur.execute(positions.APPLY_SELL, {"user_id": user_id, "company_id": company_id,
+                                                   "quantity": quantity, "total": total_proceeds})
                 
                 # Update balance (add proceeds)
                 cur.execute("""
@@ -729,9 +1066,11 @@ def sell_stock():
 
 # graceful shutdown
 def _shutdown(*_):
-    ws_thread.stop()
+    feed.stop()
+    if db_pool:
+        db_pool.closeall()
     os._exit(0)
-atexit.register(ws_thread.stop)
+atexit.register(feed.stop)
 signal.signal(signal.SIGINT, _shutdown)
 signal.signal(signal.SIGTERM, _shutdown)
 
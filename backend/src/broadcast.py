@@ -0,0 +1,355 @@
+"""Fan-out of live market events to streaming clients.
+
+Every event is encoded into its final SSE frame exactly once and the same
+immutable ``bytes`` object is handed to each subscriber, so the cost of a
+tick no longer grows with the number of open dashboards.
+
+Subscribers may ask for a subset of symbols. The broadcaster keeps an index
+from symbol to the subscribers that want it, stored as tuples that are
+replaced (never mutated) on subscribe/unsubscribe, so ``publish`` reads them
+without taking the lock and only touches the interested queues.
+
+A plain subscriber is a bounded FIFO; if a slow client lets it fill up the
+subscriber is dropped and its stream ends so the browser reconnects. A
+conflating subscriber instead keeps one slot per symbol holding only the
+newest frame, so slow readers always catch up to the latest state in
+bounded memory without being cut off.
+
+``TickBatcher`` optionally coalesces trades into one ``{"type":"quotes"}``
+frame per flush (time window or batch size, whichever comes first), so a
+burst of trades costs one queue put and one client wakeup instead of one
+per trade.
+
+Every published event carries a monotonically increasing SSE ``id:`` and is
+kept in a bounded ring buffer. A reconnecting client that sends
+``Last-Event-ID`` gets the events it missed replayed (filtered to its
+symbols) and only falls back to a fresh snapshot once that id has been
+evicted from the ring (or was issued by another process). Subscribers hand
+out ids in increasing order only: a frame that comes out behind a higher id
+already delivered (publishers race outside the lock) loses its ``id:`` line,
+so the client's ``Last-Event-ID`` never moves backwards.
+"""
+import queue, random, threading, time
+from collections import deque
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from serialize import dumps
+
+KEEPALIVE = b": keepalive\n\n"   # SSE comment line, ignored by EventSource
+
+
+def sse_frame(obj, event_id: Optional[int] = None) -> bytes:
+    """Encode an event as a complete ``data: ...\\n\\n`` SSE frame, optionally with an ``id:``."""
+    data = b"data: " + dumps(obj) + b"\n\n"
+    return data if event_id is None else b"id: %d\n" % event_id + data
+
+
+def parse_event_id(raw: Optional[str]) -> Optional[int]:
+    """Parse a ``Last-Event-ID`` header (or ``?lastEventId=``) value."""
+    try:
+        return int(raw) if raw else None
+    except ValueError:
+        return None
+
+
+def parse_symbols(raw: Optional[str]):
+    """Turn a ``?symbols=AAPL,TSLA`` value into a frozenset, or None for "everything"."""
+    if not raw:
+        return None
+    syms = frozenset(s.strip().upper() for s in raw.split(",") if s.strip())
+    return syms or None
+
+
+class Subscriber(queue.Queue):
+    """Bounded queue of encoded frames for one client, plus its symbol filter."""
+
+    def __init__(self, maxsize: int = 1024, symbols=None):
+        super().__init__(maxsize=maxsize)
+        self.symbols = symbols      # None = all symbols
+        self.dropped = False        # set when the client fell too far behind
+        self.conflated = 0          # frames overwritten before being read
+        self.last_id = None         # id of the newest event published before this client joined
+        self.sent_id = None         # highest id handed out by get(); lower ones go out without an id
+        self.backlog = None         # frames to replay on resume, None = send a snapshot
+
+    def wants(self, symbol: str) -> bool:
+        return self.symbols is None or symbol in self.symbols
+
+    def offer(self, frame: bytes, key=None) -> bool:
+        """Enqueue without blocking; returns False if the subscriber must be dropped."""
+        try:
+            self.put_nowait(frame)
+            return True
+        except queue.Full:
+            self.dropped = True
+            return False
+
+    def _monotonic(self, frame: bytes) -> bytes:
+        """``frame``, minus its ``id:`` line if that id is not above the last one handed out."""
+        if frame.startswith(b"id: "):
+            end = frame.index(b"\n")
+            event_id = int(frame[4:end])
+            if self.sent_id is not None and event_id <= self.sent_id:
+                return frame[end + 1:]
+            self.sent_id = event_id
+        return frame
+
+    # queue.Queue storage hook, called with the queue mutex held
+    def _get(self):
+        return self._monotonic(self.queue.popleft())
+
+
+class ConflatingSubscriber(Subscriber):
+    """Latest-value buffer: one pending frame per key (symbol), newest wins.
+
+    Built on ``queue.Queue``'s storage hooks so ``get(timeout=...)`` keeps its
+    blocking semantics. Memory is bounded by the number of distinct keys, so
+    the buffer is never full and the subscriber is never dropped.
+    """
+
+    def __init__(self, symbols=None):
+        super().__init__(maxsize=0, symbols=symbols)
+
+    def offer(self, frame: bytes, key=None) -> bool:
+        self.put_nowait((key, frame))
+        return True
+
+    # queue.Queue storage hooks, called with the queue mutex held
+    def _init(self, maxsize):
+        self.queue = {}             # key -> frame, oldest pending frame first
+
+    def _qsize(self):
+        return len(self.queue)
+
+    def _put(self, item):
+        key, frame = item
+        if self.queue.pop(key, None) is not None:
+            self.conflated += 1     # re-inserted at the end, so frames leave in id order
+        self.queue[key] = frame
+
+    def _get(self):
+        return self._monotonic(self.queue.pop(next(iter(self.queue))))
+
+
+class Broadcaster:
+    """Thread-safe registry of subscriber queues that receive pre-encoded frames."""
+
+    def __init__(self, maxsize: int = 1024, replay: int = 4096):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        # event ids start at a random 62-bit offset, so an id handed out by a
+        # previous process or another worker reads as evicted, never as valid
+        self._seq = random.getrandbits(62)
+        self._ring = deque(maxlen=replay)   # (id, symbol, frame, batch quotes or None)
+        # copy-on-write views, swapped atomically under _lock
+        self._everyone: Tuple[Subscriber, ...] = ()
+        self._unfiltered: Tuple[Subscriber, ...] = ()
+        self._by_symbol: Dict[str, Tuple[Subscriber, ...]] = {}
+        self.dropped = 0                    # slow subscribers cut off
+        self._retired_conflated = 0         # conflation counts of closed subscribers
+
+    def publish(self, obj, symbol: Optional[str] = None):
+        """Encode ``obj`` once and fan it out.
+
+        With ``symbol`` set, only subscribers interested in that symbol get the
+        frame; events without a symbol (status messages) go to everyone.
+        """
+        body = sse_frame(obj)
+        with self._lock:
+            self._seq += 1
+            frame = b"id: %d\n" % self._seq + body
+            self._ring.append((self._seq, symbol, frame, None))
+            if symbol is None:
+                targets = self._everyone
+            else:
+                targets = self._unfiltered + self._by_symbol.get(symbol, ())
+        self._drop([q for q in targets if not q.offer(frame, symbol)])
+
+    def publish_batch(self, quotes: List[dict]):
+        """Fan out a batch of ``{"symbol","price","ts"}`` quotes as ``quotes`` frames.
+
+        Each subscriber gets one frame holding only the symbols it wants; every
+        distinct symbol selection is encoded once and shared. Conflating
+        subscribers get the newest ``quote`` frame per symbol instead, so their
+        one-slot-per-symbol buffers keep working. All of them share one event id.
+        """
+        if not quotes:
+            return
+        newest: Dict[str, dict] = {}
+        for q in quotes:
+            newest[q["symbol"]] = q
+        batch_syms = frozenset(newest)
+        full = sse_frame({"type": "quotes", "data": quotes})
+
+        with self._lock:
+            self._seq += 1
+            event_id = self._seq
+            prefix = b"id: %d\n" % event_id
+            self._ring.append((event_id, None, prefix + full, quotes))
+            unfiltered, by_symbol = self._unfiltered, self._by_symbol
+
+        targets = dict.fromkeys(unfiltered)
+        for s in batch_syms:
+            targets.update(dict.fromkeys(by_symbol.get(s, ())))
+
+        frames: Dict[Optional[frozenset], bytes] = {None: prefix + full}
+        quote_frames: Dict[str, bytes] = {}
+        dead = []
+        for sub in targets:
+            if isinstance(sub, ConflatingSubscriber):
+                for s, q in newest.items():
+                    if sub.wants(s):
+                        f = quote_frames.get(s)
+                        if f is None:
+                            f = quote_frames[s] = sse_frame({"type": "quote", **q}, event_id)
+                        sub.offer(f, s)
+                continue
+            key = None
+            if sub.symbols is not None and not batch_syms <= sub.symbols:
+                key = batch_syms & sub.symbols
+            f = frames.get(key)
+            if f is None:
+                f = frames[key] = sse_frame({"type": "quotes", "data": [q for q in quotes if q["symbol"] in key]}, event_id)
+            if not sub.offer(f):
+                dead.append(sub)
+        self._drop(dead)
+
+    def _replay(self, q: Subscriber, last_id: int):
+        """Frames published after ``last_id`` that ``q`` wants, or None if evicted."""
+        ring = self._ring
+        if not ring or last_id > self._seq or last_id < ring[0][0] - 1:
+            return None
+        frames = []
+        for event_id, symbol, frame, quotes in islice(ring, last_id - ring[0][0] + 1, None):
+            if quotes is None:
+                if symbol is None or q.wants(symbol):
+                    frames.append(frame)
+            elif q.symbols is None:
+                frames.append(frame)
+            else:
+                data = [x for x in quotes if x["symbol"] in q.symbols]
+                if data:
+                    frames.append(sse_frame({"type": "quotes", "data": data}, event_id))
+        return frames
+
+    def _drop(self, dead):
+        if not dead:
+            return
+        with self._lock:
+            self.dropped += len(dead)
+        for q in dead:
+            self.unsubscribe(q)
+
+    def subscribe(self, symbols: Optional[Iterable[str]] = None, conflate: bool = False,
+                  last_event_id: Optional[int] = None) -> Subscriber:
+        symbols = frozenset(symbols) if symbols is not None else None
+        q = ConflatingSubscriber(symbols) if conflate else Subscriber(self.maxsize, symbols)
+        return self.add(q, last_event_id)
+
+    def add(self, q: Subscriber, last_event_id: Optional[int] = None) -> Subscriber:
+        """Register an already-built subscriber (e.g. one that wakes an event loop).
+
+        Registration and the replay lookup happen under the same lock that
+        assigns event ids, so every event lands either in ``q.backlog`` or in
+        the queue, never both and never neither. ``q.backlog`` stays None when
+        the client has to start over from a snapshot.
+        """
+        with self._lock:
+            q.last_id = q.sent_id = self._seq
+            if last_event_id is not None:
+                q.backlog = self._replay(q, last_event_id)
+            self._everyone += (q,)
+            if q.symbols is None:
+                self._unfiltered += (q,)
+            else:
+                by_symbol = dict(self._by_symbol)
+                for s in q.symbols:
+                    by_symbol[s] = by_symbol.get(s, ()) + (q,)
+                self._by_symbol = by_symbol
+        return q
+
+    def unsubscribe(self, q: Subscriber):
+        with self._lock:
+            if q not in self._everyone:
+                return
+            self._everyone = tuple(x for x in self._everyone if x is not q)
+            self._retired_conflated += q.conflated
+            if q.symbols is None:
+                self._unfiltered = tuple(x for x in self._unfiltered if x is not q)
+            else:
+                by_symbol = dict(self._by_symbol)
+                for s in q.symbols:
+                    rest = tuple(x for x in by_symbol.get(s, ()) if x is not q)
+                    if rest:
+                        by_symbol[s] = rest
+                    else:
+                        by_symbol.pop(s, None)
+                self._by_symbol = by_symbol
+
+    def stats(self) -> dict:
+        subs = self._everyone
+        return {
+            "subscribers": len(subs),
+            "conflating": sum(1 for q in subs if isinstance(q, ConflatingSubscriber)),
+            "conflated": self._retired_conflated + sum(q.conflated for q in subs),
+            "dropped": self.dropped,
+        }
+
+    def depths(self) -> List[int]:
+        """Current queue depth of every subscriber (takes each queue's mutex; not for the hot path)."""
+        return [q.qsize() for q in self._everyone]
+
+    def __len__(self):
+        return len(self._everyone)
+
+
+class TickBatcher(threading.Thread):
+    """Collects quotes and flushes them to a Broadcaster as ``quotes`` frames.
+
+    A flush happens ``window_ms`` after the first pending quote arrived, or
+    immediately once ``max_batch`` quotes are pending, whichever comes first.
+    """
+
+    def __init__(self, hub: Broadcaster, window_ms: int = 50, max_batch: int = 500):
+        super().__init__(daemon=True, name="tick-batcher")
+        self.hub = hub
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self._pending: List[dict] = []
+        self._first_at = 0.0
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+
+    def add_many(self, quotes: List[dict]):
+        if not quotes:
+            return
+        with self._cond:
+            if not self._pending:
+                self._first_at = time.monotonic()
+            self._pending.extend(quotes)
+            if len(self._pending) == len(quotes) or len(self._pending) >= self.max_batch:
+                self._cond.notify()
+
+    def add(self, quote: dict):
+        self.add_many([quote])
+
+    def run(self):
+        while not self._stop.is_set():
+            with self._cond:
+                while not self._pending and not self._stop.is_set():
+                    self._cond.wait()
+                while len(self._pending) < self.max_batch and not self._stop.is_set():
+                    remaining = self._first_at + self.window - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch, self._pending = self._pending, []
+            while batch:
+                self.hub.publish_batch(batch[:self.max_batch])
+                batch = batch[self.max_batch:]
+
+    def stop(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify()
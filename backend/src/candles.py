@@ -0,0 +1,154 @@
+"""Live OHLCV candles rolled up from the trade stream.
+
+Each (symbol, interval) keeps its bars in a fixed-size ring of ``array``
+columns, so memory is bounded and set up front, and reading the last N bars
+copies plain numbers instead of walking Python objects. Bars are keyed by
+the trade's own timestamp, floored to the interval. A trade older than the
+newest bar of its series is counted in ``late`` and otherwise ignored;
+Finnhub delivers trades per symbol in order, so in practice only replays
+that restart see this.
+
+``CANDLE_BARS`` picks the intervals and how many bars each one keeps:
+
+    CANDLE_BARS="1s:900,1m:1440,5m:576"     # 15 minutes, 1 day, 2 days
+"""
+import threading
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+_UNITS = {"s": 1000, "m": 60_000, "h": 3_600_000}
+
+
+def parse_interval(name: str) -> int:
+    """``"1s"`` / ``"5m"`` / ``"1h"`` -> milliseconds; raises ValueError."""
+    name = name.strip().lower()
+    ms = int(name[:-1]) * _UNITS[name[-1]] if name and name[-1] in _UNITS else 0
+    if ms <= 0:
+        raise ValueError(f"bad candle interval {name!r}")
+    return ms
+
+
+def parse_spec(spec: str) -> List[Tuple[str, int]]:
+    """``"1s:900,1m:1440"`` -> ``[("1s", 900), ("1m", 1440)]``."""
+    out = []
+    for part in spec.split(","):
+        if part.strip():
+            name, _, bars = part.partition(":")
+            parse_interval(name)
+            out.append((name.strip().lower(), int(bars)))
+    return out
+
+
+class CandleSeries:
+    """Ring buffer of OHLCV bars for one symbol at one interval."""
+
+    __slots__ = ("step", "cap", "t", "o", "h", "l", "c", "v", "head", "count")
+
+    def __init__(self, step_ms: int, capacity: int):
+        self.step = step_ms
+        self.cap = capacity
+        self.t = array("q", bytes(8 * capacity))     # bar start, ms since epoch
+        self.o = array("d", bytes(8 * capacity))
+        self.h = array("d", bytes(8 * capacity))
+        self.l = array("d", bytes(8 * capacity))
+        self.c = array("d", bytes(8 * capacity))
+        self.v = array("d", bytes(8 * capacity))
+        self.head = -1          # slot of the newest bar
+        self.count = 0
+
+    def add(self, ts: int, price: float, volume: float) -> bool:
+        """Fold one trade into its bar; returns False for a trade behind the newest bar."""
+        start = ts - ts % self.step
+        i = self.head
+        if self.count and start == self.t[i]:
+            if price > self.h[i]:
+                self.h[i] = price
+            elif price < self.l[i]:
+                self.l[i] = price
+            self.c[i] = price
+            self.v[i] += volume
+            return True
+        if self.count and start < self.t[i]:
+            return False
+        i = self.head = (i + 1) % self.cap
+        self.t[i] = start
+        self.o[i] = self.h[i] = self.l[i] = self.c[i] = price
+        self.v[i] = volume
+        if self.count < self.cap:
+            self.count += 1
+        return True
+
+    def bars(self, limit: int = 0, since: Optional[int] = None) -> List[dict]:
+        """Oldest-first bars, the last one possibly still open."""
+        n = self.count if limit <= 0 else min(limit, self.count)
+        out = []
+        for k in range(n - 1, -1, -1):
+            i = (self.head - k) % self.cap
+            if since is not None and self.t[i] < since:
+                continue
+            out.append({"t": self.t[i], "o": self.o[i], "h": self.h[i], "l": self.l[i],
+                        "c": self.c[i], "v": self.v[i]})
+        return out
+
+    def columns(self, limit: int = 0, since: Optional[int] = None) -> Dict[str, list]:
+        """The same bars as ``bars``, as ``{"t": [...], "o": [...], ...}`` columns."""
+        n = self.count if limit <= 0 else min(limit, self.count)
+        idx = [(self.head - k) % self.cap for k in range(n - 1, -1, -1)]
+        if since is not None:
+            idx = [i for i in idx if self.t[i] >= since]
+        return {name: [col[i] for i in idx] for name, col in
+                (("t", self.t), ("o", self.o), ("h", self.h), ("l", self.l), ("c", self.c), ("v", self.v))}
+
+
+class CandleAggregator:
+    """Per-symbol candle series for a fixed set of intervals, fed with parsed quotes."""
+
+    def __init__(self, spec: List[Tuple[str, int]]):
+        self.intervals = {name: (parse_interval(name), bars) for name, bars in spec}
+        self._series: Dict[str, Dict[str, CandleSeries]] = {}
+        self._lock = threading.Lock()
+        self.late = 0
+
+    def _for(self, symbol: str) -> Dict[str, CandleSeries]:
+        s = self._series.get(symbol)
+        if s is None:
+            s = self._series[symbol] = {name: CandleSeries(step, bars)
+                                        for name, (step, bars) in self.intervals.items()}
+        return s
+
+    def add(self, quotes):
+        """Quote listener: ``quotes`` are ``{"symbol","price","ts","volume"}`` dicts."""
+        with self._lock:
+            for q in quotes:
+                ts = q.get("ts")
+                if ts is None:
+                    continue
+                vol = q.get("volume") or 0.0
+                for series in self._for(q["symbol"]).values():
+                    if not series.add(ts, q["price"], vol):
+                        self.late += 1
+
+    def bars(self, symbol: str, interval: str, limit: int = 0, since: Optional[int] = None) -> List[dict]:
+        """Recent bars; raises KeyError for an interval that is not aggregated."""
+        if interval not in self.intervals:
+            raise KeyError(interval)
+        with self._lock:
+            series = self._series.get(symbol)
+            return series[interval].bars(limit, since) if series else []
+
+    def columns(self, symbol: str, interval: str, limit: int = 0, since: Optional[int] = None) -> Dict[str, list]:
+        """``bars`` as columns; raises KeyError for an interval that is not aggregated."""
+        if interval not in self.intervals:
+            raise KeyError(interval)
+        with self._lock:
+            series = self._series.get(symbol)
+            if series:
+                return series[interval].columns(limit, since)
+        return {name: [] for name in ("t", "o", "h", "l", "c", "v")}
+
+    def drop(self, symbol: str):
+        with self._lock:
+            self._series.pop(symbol, None)
+
+    def stats(self) -> dict:
+        return {"symbols": len(self._series), "intervals": list(self.intervals), "late": self.late}
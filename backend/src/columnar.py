@@ -0,0 +1,98 @@
+"""Column-oriented encodings for time-series responses.
+
+``?format=columnar`` returns one array per field instead of one object per
+bar, oldest first, which is what chart libraries take as input:
+
+    {"t": [ms, ...], "o": [...], "h": [...], "l": [...], "c": [...], "a": [...], "v": [...]}
+
+``t`` is epoch milliseconds (stored timestamps are UTC), prices are numbers.
+
+``?format=binary`` sends the same columns as packed little-endian values
+(``application/octet-stream``). Everything is 8-byte aligned, so a browser
+can view each column as a ``Float64Array`` / ``BigInt64Array`` without
+copying:
+
+    0   b"TSC1"
+    4   uint32 rows
+    8   uint32 column count
+    12  4 bytes padding
+    16  per column: 7-byte ASCII name (NUL padded) + 1-byte type, b"q" int64 or b"d" float64
+    ..  per column, in header order: rows x 8-byte values
+
+A missing float is NaN and a missing integer is 0.
+"""
+import struct, sys
+from array import array
+from datetime import timezone
+from typing import Dict, Iterable, List, Sequence
+
+FORMATS = ("rows", "columnar", "binary")     # ?format= values of the time-series endpoints
+MAGIC = b"TSC1"
+_HEADER = struct.Struct("<4sII4x")
+_COLUMN = struct.Struct("<7sc")
+_NAN = float("nan")
+
+# /stocks/prices/<symbol> row layout -> column names
+BAR_FIELDS = ("t", "o", "h", "l", "c", "a", "v")
+
+
+def _ms(ts) -> int:
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return int(ts.timestamp() * 1000)
+
+
+def _num(x):
+    return None if x is None else float(x)
+
+
+def bar_columns(rows: Sequence[tuple]) -> Dict[str, list]:
+    """Newest-first ``(trade_timestamp, open, high, low, close, adj_close, volume)`` rows -> oldest-first columns."""
+    if not rows:
+        return {f: [] for f in BAR_FIELDS}
+    ts, o, h, l, c, a, v = zip(*reversed(rows))
+    return {"t": [_ms(x) for x in ts], "o": [_num(x) for x in o], "h": [_num(x) for x in h],
+            "l": [_num(x) for x in l], "c": [_num(x) for x in c], "a": [_num(x) for x in a],
+            "v": [None if x is None else int(x) for x in v]}
+
+
+def pack(columns: Dict[str, Iterable], ints: Iterable[str] = ("t", "v")) -> bytes:
+    """Encode ``columns`` in the binary layout above; columns named in ``ints`` are int64, the rest float64."""
+    ints = set(ints)
+    names = list(columns)
+    n = len(columns[names[0]]) if names else 0
+    parts: List[bytes] = [_HEADER.pack(MAGIC, n, len(names))]
+    body: List[bytes] = []
+    for name in names:
+        if name in ints:
+            parts.append(_COLUMN.pack(name.encode("ascii"), b"q"))
+            col = array("q", [0 if x is None else x for x in columns[name]])
+        else:
+            parts.append(_COLUMN.pack(name.encode("ascii"), b"d"))
+            col = array("d", [_NAN if x is None else x for x in columns[name]])
+        if sys.byteorder != "little":
+            col.byteswap()
+        body.append(col.tobytes())
+    return b"".join(parts + body)
+
+
+def unpack(data: bytes) -> Dict[str, list]:
+    """Decode ``pack`` output (for tests and Python clients)."""
+    magic, n, ncols = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("not a TSC1 payload")
+    off = _HEADER.size
+    specs = []
+    for _ in range(ncols):
+        name, kind = _COLUMN.unpack_from(data, off)
+        specs.append((name.rstrip(b"\0").decode("ascii"), kind.decode("ascii")))
+        off += _COLUMN.size
+    out = {}
+    for name, kind in specs:
+        col = array(kind)
+        col.frombytes(data[off:off + n * 8])
+        if sys.byteorder != "little":
+            col.byteswap()
+        out[name] = col.tolist()
+        off += n * 8
+    return out
@@ -0,0 +1,75 @@
+"""Process-local ``companies.symbol -> companies_id`` registry.
+
+``companies`` is written by the loaders and almost never changes, so trade
+and price handlers look the id up here instead of running a ``SELECT``
+first. The whole table is read on first use and again once ``ttl`` seconds
+have passed; only the request that notices the expiry reloads, everyone
+else keeps using the current map meanwhile.
+
+An unknown symbol is rejected from memory. A company added by the loaders
+becomes visible after the TTL, after ``invalidate()``, or through a miss,
+which reloads the table at most once every ``miss_refresh`` seconds. That
+limit keeps repeated requests for bogus symbols from reaching the database.
+
+A failed reload (database down) keeps serving the current map and is not
+retried until the same TTL / miss limits have passed again.
+"""
+import threading, time
+from typing import Dict, Optional
+
+
+class CompanyRegistry:
+    def __init__(self, load, ttl: float = 300.0, miss_refresh: float = 30.0):
+        self.load = load                    # callable returning {symbol: companies_id}
+        self.ttl = ttl
+        self.miss_refresh = miss_refresh
+        self._ids: Optional[Dict[str, int]] = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self.reloads = 0
+        self.errors = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _reload(self, blocking: bool) -> Dict[str, int]:
+        """Read the table again and return the map now in use."""
+        if not self._lock.acquire(blocking):
+            return self._ids or {}          # someone else is already reloading
+        if blocking and self._ids is not None:
+            self._lock.release()            # loaded by the thread we waited for
+            return self._ids
+        try:
+            self._ids = self.load()
+            self.reloads += 1
+        except Exception:
+            self.errors += 1
+            if self._ids is None:
+                raise                       # nothing to fall back on
+        finally:
+            self._loaded_at = time.monotonic()      # after a failure too: retry after ttl, not per request
+            self._lock.release()
+        return self._ids
+
+    def id_for(self, symbol: str) -> Optional[int]:
+        """``companies_id`` for ``symbol``, or None if no such company."""
+        ids = self._ids
+        if ids is None:
+            ids = self._reload(blocking=True)
+        elif time.monotonic() - self._loaded_at > self.ttl:
+            ids = self._reload(blocking=False)
+        cid = ids.get(symbol)
+        if cid is None and time.monotonic() - self._loaded_at > self.miss_refresh:
+            cid = self._reload(blocking=False).get(symbol)
+        if cid is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return cid
+
+    def invalidate(self):
+        """Drop the map; the next lookup reads ``companies`` again."""
+        self._ids = None
+
+    def stats(self) -> dict:
+        return {"symbols": len(self._ids or ()), "age_s": round(time.monotonic() - self._loaded_at, 1) if self._ids else None,
+                "reloads": self.reloads, "errors": self.errors, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,161 @@
+"""Thread-safe Postgres connection pool for the request handlers.
+
+Handlers keep their ``conn = _db_conn() ... finally: conn.close()`` shape:
+``getconn`` returns a ``PooledConnection`` that behaves like the psycopg2
+connection (``with conn:`` still commits or rolls back), and whose
+``close()`` hands the connection back instead of closing the socket.
+
+* ``warm()`` opens ``minconn`` connections up front; up to ``maxconn`` exist at
+  once, and connections above ``minconn`` that sit idle for ``max_idle``
+  seconds are closed.
+* On checkout a connection that is closed, broken, or has sat idle for more
+  than ``ping_after`` seconds is checked (``SELECT 1``) and replaced if it
+  fails, so a Postgres restart costs one reconnect instead of a 500.
+* When all ``maxconn`` are in use, ``getconn`` waits up to ``timeout``
+  seconds and then raises ``PoolExhausted``, which the app turns into a 503.
+
+psycopg2's own ``ThreadedConnectionPool`` fails immediately when empty and
+does no health checks, hence this small wrapper.
+"""
+import threading, time
+
+import psycopg2
+from psycopg2 import extensions
+
+
+class PoolExhausted(Exception):
+    """No connection became free within the checkout timeout."""
+
+
+class PooledConnection:
+    """Proxy for a pooled psycopg2 connection; ``close()`` returns it to the pool."""
+
+    __slots__ = ("_pool", "_conn")
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._conn.__exit__(*exc)
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool.putconn(conn)
+
+
+class ConnectionPool:
+    def __init__(self, connect, minconn: int = 1, maxconn: int = 10, timeout: float = 5.0,
+                 ping_after: float = 30.0, max_idle: float = 300.0):
+        self.connect = connect
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self.max_idle = max_idle
+        self._idle = []             # (conn, returned_at), most recently used last
+        self._size = 0              # connections open or being opened
+        self._cv = threading.Condition()
+        self.waits = 0
+        self.exhausted = 0
+        self.replaced = 0
+
+    def warm(self):
+        """Open ``minconn`` connections now; raises if the database is unreachable."""
+        conns = [self.getconn() for _ in range(max(0, self.minconn - self._size))]
+        for c in conns:
+            c.close()
+
+    def getconn(self) -> PooledConnection:
+        deadline = time.monotonic() + self.timeout
+        with self._cv:
+            while True:
+                if self._idle:
+                    conn, since = self._idle.pop()
+                    break
+                if self._size < self.maxconn:
+                    self._size += 1
+                    conn, since = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.exhausted += 1
+                    raise PoolExhausted(f"all {self.maxconn} database connections are busy")
+                self.waits += 1
+                self._cv.wait(remaining)
+        try:
+            if conn is None:
+                conn = self.connect()
+            elif not self._healthy(conn, since):
+                self.replaced += 1
+                self._discard(conn)
+                conn = self.connect()
+        except Exception:
+            with self._cv:
+                self._size -= 1
+                self._cv.notify()
+            raise
+        return PooledConnection(self, conn)
+
+    def _healthy(self, conn, since) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - since < self.ping_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    @staticmethod
+    def _discard(conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def putconn(self, conn):
+        status = extensions.TRANSACTION_STATUS_UNKNOWN if conn.closed else conn.info.transaction_status
+        if status not in (extensions.TRANSACTION_STATUS_IDLE, extensions.TRANSACTION_STATUS_UNKNOWN):
+            try:
+                conn.rollback()     # handler left a transaction open
+                status = extensions.TRANSACTION_STATUS_IDLE
+            except psycopg2.Error:
+                status = extensions.TRANSACTION_STATUS_UNKNOWN
+        now = time.monotonic()
+        stale = []
+        with self._cv:
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                self._size -= 1
+                stale.append(conn)
+            else:
+                self._idle.append((conn, now))
+            # the front of the idle list is the least recently used
+            while self._idle and self._size > self.minconn and now - self._idle[0][1] > self.max_idle:
+                stale.append(self._idle.pop(0)[0])
+                self._size -= 1
+            self._cv.notify()
+        for c in stale:
+            self._discard(c)
+
+    def closeall(self):
+        with self._cv:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def stats(self) -> dict:
+        return {"size": self._size, "idle": len(self._idle), "max": self.maxconn,
+                "waits": self.waits, "exhausted": self.exhausted, "replaced": self.replaced}
@@ -0,0 +1,42 @@
+"""Shape-preserving downsampling for price charts.
+
+``lttb`` is Largest-Triangle-Three-Buckets: the first and last points are
+kept, the rest are split into ``n - 2`` equal buckets, and from each bucket
+it keeps the point that forms the largest triangle with the point kept
+before it and the average of the next bucket. Peaks and troughs survive,
+unlike taking every k-th point or averaging, so a few hundred points draw
+the same line as several thousand.
+"""
+from typing import List, Sequence
+
+
+def lttb(xs: Sequence[float], ys: Sequence[float], n: int) -> List[int]:
+    """Indices of the ``n`` points to keep from ``xs``/``ys`` (``xs`` ascending).
+
+    Returns every index when there are ``n`` points or fewer, or ``n < 3``.
+    """
+    size = len(xs)
+    if n >= size or n < 3:
+        return list(range(size))
+    every = (size - 2) / (n - 2)
+    keep = [0]
+    a = 0
+    for i in range(n - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        # average of the next bucket; for the last bucket that is the last point
+        nxt_end = min(int((i + 2) * every) + 1, size)
+        span = nxt_end - end
+        avg_x = sum(xs[end:nxt_end]) / span
+        avg_y = sum(ys[end:nxt_end]) / span
+
+        ax, ay = xs[a], ys[a]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        keep.append(best)
+        a = best
+    keep.append(size - 1)
+    return keep
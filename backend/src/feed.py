@@ -0,0 +1,385 @@
+"""Finnhub trade ingest and the in-memory live quote state.
+
+Shared by the Flask API (``app.py``) and the asyncio streaming server
+(``stream_server.py``). ``FEED_MODE`` decides who talks to Finnhub:
+
+* ``direct`` (default) - this process opens its own upstream websocket
+* ``owner``  - open the upstream and republish ticks on ``FEED_SOCKET``
+* ``relay``  - no upstream; mirror ticks from the owner over ``FEED_SOCKET``
+* ``auto``   - for multi-worker servers: the worker that wins the lock on
+  ``FEED_SOCKET.lock`` becomes the owner, the rest relay and take over if
+  the owner goes away
+"""
+import json, os, random, time, threading
+from typing import Dict, List
+from dotenv import load_dotenv
+import websocket  # from websocket-client
+
+from broadcast import Broadcaster, TickBatcher
+from candles import CandleAggregator, parse_spec
+from metrics import IngestMetrics, depth_percentiles
+from feed_ipc import FeedPublisher, FeedRelay, try_lock
+from recording import TickRecorder
+from snapshot import QuoteSnapshot
+
+load_dotenv()
+
+FINNHUB_TOKEN = os.environ.get("FINNHUB_TOKEN", "")
+FINNHUB_WS_URL = os.getenv("FINNHUB_WS_URL", "wss://ws.finnhub.io")   # or a local replay_server.py
+FEED_RECORD = os.getenv("FEED_RECORD", "")                            # append raw upstream messages here
+SYMBOLS = os.environ.get("SYMBOLS", "AAPL,MSFT,GOOGL,TSLA").split(",")
+STREAM_CONFLATE = os.getenv("STREAM_CONFLATE", "0") == "1"   # default for /prices/stream?conflate=
+STREAM_BATCH_MS = int(os.getenv("STREAM_BATCH_MS", "0"))       # >0 enables batched "quotes" frames
+STREAM_BATCH_MAX = int(os.getenv("STREAM_BATCH_MAX", "500"))   # flush early once this many are pending
+STREAM_REPLAY = int(os.getenv("STREAM_REPLAY", "4096"))        # recent events kept for Last-Event-ID resume
+FEED_MODE = os.getenv("FEED_MODE", "direct")                   # direct | owner | relay | auto
+FEED_SOCKET = os.getenv("FEED_SOCKET", "/tmp/finnhub-feed.sock")
+FEED_SHARD_SIZE = int(os.getenv("FEED_SHARD_SIZE", "50"))       # symbols per upstream connection
+FEED_BACKOFF_BASE = float(os.getenv("FEED_BACKOFF_BASE", "1"))   # seconds, doubled per failed attempt
+FEED_BACKOFF_CAP = float(os.getenv("FEED_BACKOFF_CAP", "60"))
+FEED_PERSIST = os.getenv("FEED_PERSIST", "0") == "1"           # owner writes ticks to intraday_ticks
+FEED_PERSIST_BATCH = int(os.getenv("FEED_PERSIST_BATCH", "5000"))
+FEED_PERSIST_MS = int(os.getenv("FEED_PERSIST_MS", "1000"))
+FEED_PERSIST_MAX = int(os.getenv("FEED_PERSIST_MAX", "200000"))  # buffered ticks before new ones are dropped
+SNAPSHOT_MIN_MS = int(os.getenv("SNAPSHOT_MIN_MS", "100"))      # max staleness of polled /prices/now
+CANDLE_BARS = os.getenv("CANDLE_BARS", "1s:900,1m:1440,5m:576")  # interval:bars kept per symbol
+
+if not FINNHUB_TOKEN and FEED_MODE != "relay":
+    raise RuntimeError("Set FINNHUB_TOKEN in .env")
+
+# ---- In-memory state ----
+latest_quotes: Dict[str, dict] = {}        # { "AAPL": {"symbol":"AAPL","price":182.31,"ts":1697040000000} }
+hub = Broadcaster(maxsize=1024, replay=STREAM_REPLAY)   # per-client queues of encoded SSE frames
+snapshot = QuoteSnapshot(latest_quotes, SNAPSHOT_MIN_MS)  # encoded sorted latest_quotes; bump() after changes
+
+def _broadcast(obj, symbol=None):
+    hub.publish(obj, symbol)
+
+def _status(obj):
+    _broadcast(obj)
+    if publisher:
+        publisher.send_status(obj)
+
+# optional micro-batching: one {"type":"quotes","data":[...]} frame per flush
+batcher = TickBatcher(hub, STREAM_BATCH_MS, STREAM_BATCH_MAX) if STREAM_BATCH_MS > 0 else None
+
+# extra consumers of parsed trades (binary websocket fan-out, ...)
+_quote_listeners = []
+
+def add_quote_listener(fn):
+    """Call ``fn(quotes)`` on the ingest thread with each message's parsed quotes.
+
+    Listeners must not block; a listener that raises is skipped for that batch.
+    """
+    _quote_listeners.append(fn)
+
+def _notify_listeners(quotes):
+    for fn in _quote_listeners:
+        try:
+            fn(quotes)
+        except Exception:
+            pass
+
+# per-thread ingest counters, merged by metrics_report()
+metrics = IngestMetrics()
+
+# live OHLCV bars, fed in every process (owner and relays alike)
+candles = CandleAggregator(parse_spec(CANDLE_BARS))
+add_quote_listener(candles.add)
+
+def ingest_quotes(quotes):
+    """Apply parsed quotes: update latest_quotes, broadcast them, notify listeners."""
+    if not quotes:
+        return
+    for q in quotes:
+        latest_quotes[q["symbol"]] = q
+    snapshot.bump()
+    t0 = time.perf_counter_ns()
+    if batcher:
+        batcher.add_many(quotes)
+    else:
+        for q in quotes:
+            _broadcast({"type":"quote", **q}, q["symbol"])
+    metrics.record(quotes, time.perf_counter_ns() - t0, time.time_ns() // 1_000_000)
+    _notify_listeners(quotes)
+
+# ---- Finnhub WS client (one thread per shard, reconnects on failure) ----
+def _backoff(attempt: int) -> float:
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2^attempt)]."""
+    return random.uniform(0, min(FEED_BACKOFF_CAP, FEED_BACKOFF_BASE * (2 ** attempt)))
+
+class FinnhubThread(threading.Thread):
+    """One upstream connection carrying a shard of the symbol universe."""
+
+    def __init__(self, token: str, symbols, shard: int = 0):
+        super().__init__(daemon=True, name=f"finnhub-shard-{shard}")
+        self.token = token
+        self.shard = shard
+        self.symbols = {s.strip() for s in symbols if s.strip()}
+        self._stop = threading.Event()
+        self.ws = None
+        self.connected = False
+        self.reconnects = 0
+
+    def run(self):
+        attempt = 0
+        while not self._stop.is_set():
+            try:
+                ws_url = f"{FINNHUB_WS_URL}?token={self.token}"
+                self.ws = websocket.WebSocketApp(
+                    ws_url,
+                    on_open=self.on_open,
+                    on_message=self.on_message,
+                    on_error=self.on_error,
+                    on_close=self.on_close
+                )
+                self.ws.run_forever(ping_interval=20, ping_timeout=10)  # keepalive
+            except Exception:
+                pass
+            if self.connected:
+                attempt = 0         # the last connection worked; start backoff over
+            self.connected = False
+            if self._stop.is_set():
+                break
+            self.reconnects += 1
+            self._stop.wait(_backoff(attempt))
+            attempt += 1
+
+    def stop(self):
+        self._stop.set()
+        try:
+            if self.ws:
+                self.ws.close()
+        except Exception:
+            pass
+
+    def _send(self, msg_type: str, symbol: str):
+        # safe from other threads: websocket-client serialises sends
+        if self.connected:
+            try:
+                self.ws.send(json.dumps({"type": msg_type, "symbol": symbol}))
+            except Exception:
+                pass        # the reconnect resubscribes from self.symbols
+
+    def subscribe(self, symbol: str):
+        self.symbols.add(symbol)
+        self._send("subscribe", symbol)
+
+    def unsubscribe(self, symbol: str):
+        self.symbols.discard(symbol)
+        self._send("unsubscribe", symbol)
+
+    # ---- WS callbacks ----
+    def on_open(self, ws):
+        self.connected = True
+        for s in list(self.symbols):
+            ws.send(json.dumps({"type":"subscribe", "symbol": s}))
+        _status({"type":"status","msg":"connected","shard":self.shard,"at":int(time.time()*1000)})
+
+    def on_message(self, ws, message):
+        if recorder:
+            recorder.record(message)
+        try:
+            obj = json.loads(message)
+            if obj.get("type") == "trade":
+                quotes = []
+                for t in obj.get("data", []):
+                    sym = t.get("s")
+                    price = t.get("p")
+                    ts = t.get("t")
+                    if sym and price is not None:
+                        quotes.append({"symbol": sym, "price": price, "ts": ts, "volume": t.get("v")})
+                ingest_quotes(quotes)
+        except Exception:
+            pass
+
+    def on_error(self, ws, error):
+        _status({"type":"status","msg":"ws_error","shard":self.shard,"detail":str(error), "at":int(time.time()*1000)})
+
+    def on_close(self, ws, code, reason):
+        _status({"type":"status","msg":"disconnected","shard":self.shard,"code":code,"reason":str(reason),"at":int(time.time()*1000)})
+
+shards: List[FinnhubThread] = []
+_shards_lock = threading.Lock()
+_symbols = {s.strip() for s in SYMBOLS if s.strip()}    # current universe (mirrored from the owner in relays)
+recorder = None         # TickRecorder when FEED_RECORD is set
+writer = None           # TickWriter when FEED_PERSIST is set
+publisher = None        # FeedPublisher when this process owns the upstream for others
+relay = None            # FeedRelay when another process owns it
+_owner_lock = None
+
+def symbols() -> List[str]:
+    return sorted(_symbols)
+
+def _start_shard(syms) -> FinnhubThread:
+    shard = FinnhubThread(FINNHUB_TOKEN, syms, shard=max((sh.shard for sh in shards), default=-1) + 1)
+    shards.append(shard)
+    shard.start()
+    return shard
+
+def _symbols_changed():
+    if publisher:
+        publisher.send_symbols(symbols())
+
+def add_symbols(syms) -> List[str]:
+    """Subscribe to more symbols at runtime; only the shard that takes each one is touched."""
+    syms = [s for s in dict.fromkeys(x.strip().upper() for x in syms) if s]
+    if relay:
+        relay.send({"add": syms})       # the owner applies it and echoes the new universe
+        return [s for s in syms if s not in _symbols]
+    added = []
+    with _shards_lock:
+        for s in syms:
+            if s in _symbols:
+                continue
+            open_shards = [sh for sh in shards if len(sh.symbols) < FEED_SHARD_SIZE]
+            if open_shards:
+                min(open_shards, key=lambda sh: len(sh.symbols)).subscribe(s)
+            else:
+                _start_shard([s])
+            _symbols.add(s)
+            added.append(s)
+    if added:
+        _symbols_changed()
+    return added
+
+def remove_symbols(syms) -> List[str]:
+    """Unsubscribe symbols at runtime; a shard left with no symbols is closed."""
+    syms = [s for s in dict.fromkeys(x.strip().upper() for x in syms) if s]
+    if relay:
+        relay.send({"remove": syms})
+        return [s for s in syms if s in _symbols]
+    removed = []
+    with _shards_lock:
+        for s in syms:
+            if s not in _symbols:
+                continue
+            for sh in shards:
+                if s in sh.symbols:
+                    sh.unsubscribe(s)
+                    if not sh.symbols:
+                        sh.stop()
+                        shards.remove(sh)
+                    break
+            _symbols.discard(s)
+            latest_quotes.pop(s, None)
+            candles.drop(s)
+            removed.append(s)
+    if removed:
+        snapshot.bump()
+        _symbols_changed()
+    return removed
+
+def shard_info() -> List[dict]:
+    return [{"shard": sh.shard, "connected": sh.connected, "reconnects": sh.reconnects,
+             "symbols": sorted(sh.symbols)} for sh in list(shards)]
+
+def metrics_report() -> dict:
+    """Everything /metrics shows: ingest rates and timings, fan-out state, upstream health."""
+    out = metrics.report()
+    out["subscribers"] = dict(hub.stats(), queue_depth=depth_percentiles(hub.depths()))
+    out["upstream"] = {
+        "role": role(),
+        "shards": len(shards),
+        "connected": sum(1 for sh in list(shards) if sh.connected),
+        "reconnects": sum(sh.reconnects for sh in list(shards)) + (relay.reconnects if relay else 0),
+    }
+    return out
+
+def _on_relay_command(msg):
+    # owner side: a relay worker forwarded an admin change
+    if "add" in msg:
+        add_symbols(msg["add"])
+    elif "remove" in msg:
+        remove_symbols(msg["remove"])
+
+def _mirror_symbols(syms):
+    global _symbols
+    gone = _symbols.difference(syms)
+    _symbols = set(syms)
+    for s in gone:
+        latest_quotes.pop(s, None)
+        candles.drop(s)
+    snapshot.bump()
+
+def _become_owner(share: bool):
+    global publisher, recorder, writer
+    if FEED_RECORD:
+        recorder = TickRecorder(FEED_RECORD)
+    if FEED_PERSIST:
+        # only the owner persists, so N workers do not write N copies
+        from tick_writer import TickWriter
+        writer = TickWriter(batch=FEED_PERSIST_BATCH, flush_ms=FEED_PERSIST_MS, max_pending=FEED_PERSIST_MAX)
+        add_quote_listener(writer.add)
+        writer.start()
+    if share:
+        publisher = FeedPublisher(FEED_SOCKET, lambda: list(latest_quotes.values()), symbols, _on_relay_command)
+        add_quote_listener(publisher.send_quotes)
+        publisher.start()
+    universe = symbols()
+    with _shards_lock:
+        for i in range(0, len(universe), FEED_SHARD_SIZE):
+            _start_shard(universe[i:i + FEED_SHARD_SIZE])
+
+def _try_takeover():
+    # called by the relay when the owner connection drops
+    global _owner_lock, relay
+    _owner_lock = try_lock(FEED_SOCKET + ".lock")
+    if _owner_lock is None:
+        return False
+    relay = None
+    _become_owner(share=True)
+    return True
+
+def _load_snapshot(quotes):
+    latest_quotes.update((q["symbol"], q) for q in quotes)
+    snapshot.bump()
+
+def _start_relay(failover: bool):
+    global relay
+    relay = FeedRelay(FEED_SOCKET, on_snapshot=_load_snapshot,
+                      on_quotes=ingest_quotes, on_status=_broadcast, on_symbols=_mirror_symbols,
+                      on_lost=_try_takeover if failover else None)
+    relay.start()
+
+def start():
+    """Start ingest for this process (once) according to FEED_MODE."""
+    global _owner_lock
+    if shards or relay:
+        return
+    if batcher:
+        batcher.start()
+    if FEED_MODE == "relay":
+        _start_relay(failover=False)
+    elif FEED_MODE == "owner":
+        _owner_lock = try_lock(FEED_SOCKET + ".lock")
+        if _owner_lock is None:
+            raise RuntimeError(f"another process already owns the feed at {FEED_SOCKET}")
+        _become_owner(share=True)
+    elif FEED_MODE == "auto":
+        _owner_lock = try_lock(FEED_SOCKET + ".lock")
+        if _owner_lock is not None:
+            _become_owner(share=True)
+        else:
+            _start_relay(failover=True)
+    else:
+        _become_owner(share=False)
+
+def role() -> str:
+    if relay:
+        return "relay"
+    return "owner" if publisher else "direct"
+
+def stop():
+    for sh in list(shards):
+        sh.stop()
+    if publisher:
+        publisher.stop()
+    if relay:
+        relay.stop()
+    if batcher:
+        batcher.stop()
+    if recorder:
+        recorder.close()
+    if writer:
+        writer.stop()
@@ -0,0 +1,203 @@
+"""Share one upstream Finnhub connection between worker processes.
+
+Exactly one process (the *owner*) runs ``FinnhubThread`` and republishes the
+parsed ticks over a Unix domain socket; every other worker runs a
+``FeedRelay`` that feeds them into its own ``latest_quotes`` and broadcaster.
+With ``FEED_MODE=auto`` the owner is elected by an exclusive ``flock`` on
+``<FEED_SOCKET>.lock``; the kernel releases it if the owner dies, and the
+first relay to notice takes over.
+
+Wire format is newline-delimited JSON, one message per line:
+
+    owner -> relay
+    {"snap": [quote, ...]}      latest quotes, sent once when a relay connects
+    {"syms": [symbol, ...]}     current symbol universe, on connect and on change
+    {"q": [quote, ...]}         ticks from one upstream message
+    {"s": {...}}                status event
+
+    relay -> owner
+    {"add": [symbol, ...]}      runtime subscribe requested through a relay's admin API
+    {"remove": [symbol, ...]}
+"""
+import fcntl, json, os, queue, socket, threading, time
+
+RELAY_QUEUE = 4096          # lines buffered per relay before it is disconnected
+
+
+def try_lock(path: str):
+    """Take the owner lock without blocking; returns the open fd or None."""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return fd
+    except OSError:
+        os.close(fd)
+        return None
+
+
+def encode(msg) -> bytes:
+    return json.dumps(msg, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+class _RelayConn(threading.Thread):
+    """Writer thread for one connected relay, so a stuck worker never blocks ingest."""
+
+    def __init__(self, conn: socket.socket, publisher):
+        super().__init__(daemon=True, name="feed-relay-conn")
+        self.conn = conn
+        self.publisher = publisher
+        self.q = queue.Queue(maxsize=RELAY_QUEUE)
+        threading.Thread(target=self._read_commands, daemon=True, name="feed-relay-cmd").start()
+
+    def _read_commands(self):
+        try:
+            for line in self.conn.makefile("rb"):
+                self.publisher.on_command(json.loads(line))
+        except (OSError, ValueError):
+            pass
+
+    def run(self):
+        try:
+            while True:
+                self.conn.sendall(self.q.get())
+        except OSError:
+            pass
+        finally:
+            self.publisher._remove(self)
+            self.conn.close()
+
+    def close(self):
+        try:
+            self.conn.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+class FeedPublisher(threading.Thread):
+    """Owner side: accepts relay connections and sends them every tick."""
+
+    def __init__(self, path: str, snapshot, symbols, on_command):
+        super().__init__(daemon=True, name="feed-publisher")
+        self.path = path
+        self.snapshot = snapshot        # callable returning the current quotes
+        self.symbols = symbols          # callable returning the symbol universe
+        self.on_command = on_command    # called with add/remove requests from relays
+        self._conns = set()
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            os.unlink(path)             # stale socket from a dead owner; we hold the lock
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(path)
+        self.sock.listen(64)
+
+    def run(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            c = _RelayConn(conn, self)
+            c.q.put_nowait(encode({"snap": self.snapshot()}))
+            c.q.put_nowait(encode({"syms": self.symbols()}))
+            with self._lock:
+                self._conns.add(c)
+            c.start()
+
+    def _send(self, line: bytes):
+        with self._lock:
+            conns = list(self._conns)
+        for c in conns:
+            try:
+                c.q.put_nowait(line)
+            except queue.Full:
+                # relay fell behind: cut it off, it reconnects and resyncs from the snapshot
+                self._remove(c)
+                c.close()
+
+    def _remove(self, c):
+        with self._lock:
+            self._conns.discard(c)
+
+    def send_quotes(self, quotes):
+        self._send(encode({"q": quotes}))
+
+    def send_status(self, obj):
+        self._send(encode({"s": obj}))
+
+    def send_symbols(self, symbols):
+        self._send(encode({"syms": symbols}))
+
+    def stop(self):
+        try:
+            self.sock.close()
+            os.unlink(self.path)
+        except OSError:
+            pass
+        with self._lock:
+            conns = list(self._conns)
+        for c in conns:
+            c.close()
+
+
+class FeedRelay(threading.Thread):
+    """Worker side: mirrors the owner's ticks into this process.
+
+    ``on_lost`` is called whenever the owner connection drops; returning True
+    means this process just became the owner and the relay should exit.
+    """
+
+    def __init__(self, path: str, on_snapshot, on_quotes, on_status, on_symbols, on_lost=None):
+        super().__init__(daemon=True, name="feed-relay")
+        self.path = path
+        self.on_snapshot = on_snapshot
+        self.on_quotes = on_quotes
+        self.on_status = on_status
+        self.on_symbols = on_symbols
+        self.on_lost = on_lost
+        self._stop = threading.Event()
+        self._send_lock = threading.Lock()
+        self.sock = None
+        self.reconnects = 0
+
+    def send(self, msg):
+        """Forward a command to the owner (best effort; lost if the owner is down)."""
+        try:
+            with self._send_lock:
+                self.sock.sendall(encode(msg))
+        except (OSError, AttributeError):
+            pass
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self.sock.connect(self.path)
+                for line in self.sock.makefile("rb"):
+                    msg = json.loads(line)
+                    if "q" in msg:
+                        self.on_quotes(msg["q"])
+                    elif "s" in msg:
+                        self.on_status(msg["s"])
+                    elif "syms" in msg:
+                        self.on_symbols(msg["syms"])
+                    elif "snap" in msg:
+                        self.on_snapshot(msg["snap"])
+            except (OSError, ValueError):
+                pass
+            finally:
+                if self.sock:
+                    self.sock.close()
+            if self._stop.is_set():
+                return
+            if self.on_lost and self.on_lost():
+                return
+            self.reconnects += 1
+            time.sleep(0.5)
+
+    def stop(self):
+        self._stop.set()
+        try:
+            if self.sock:
+                self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
@@ -0,0 +1,101 @@
+"""HTTP caching pieces for the read-mostly market-data endpoints.
+
+``data_versions`` (migration 0005) holds a counter per table that triggers
+bump on every write. ``DataVersions`` keeps a copy in memory, re-read at most
+every ``ttl`` seconds, so building an ETag costs no query. As in
+``CompanyRegistry``, only the request that notices the expiry reloads; the
+others keep using the current copy.
+
+``BodyCache`` keeps encoded response bodies keyed by ETag (URL, date and
+data versions) and content encoding, so each version of a response is
+queried and compressed once per process, and a revalidation whose body is
+cached is answered with a ``304`` without touching the database. Least
+recently used bodies go first once ``max_bytes`` is reached.
+
+Brotli is used when the ``brotli`` package is installed, gzip otherwise.
+"""
+import gzip, threading, time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+MIN_COMPRESS = 1024             # smaller bodies are sent as they are
+
+
+def encode(body: bytes, encoding: Optional[str]) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=6)
+    return body
+
+
+class DataVersions:
+    def __init__(self, load, ttl: float = 5.0):
+        self.load = load                    # callable returning {name: (version, updated_at)}
+        self.ttl = ttl
+        self._versions: Optional[Dict[str, tuple]] = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self.reloads = 0
+        self.errors = 0
+
+    def get(self) -> Optional[Dict[str, tuple]]:
+        """``{name: (version, updated_at)}``, or None while the versions cannot be read."""
+        if time.monotonic() - self._loaded_at > self.ttl and self._lock.acquire(self._versions is None):
+            try:
+                if time.monotonic() - self._loaded_at > self.ttl:
+                    self._versions = self.load()
+                    self.reloads += 1
+            except Exception:
+                self.errors += 1            # table missing or database down: keep the last copy
+            finally:
+                self._loaded_at = time.monotonic()      # either way, try again after ttl
+                self._lock.release()
+        return self._versions
+
+    def stats(self) -> dict:
+        return {"versions": {k: v[0] for k, v in (self._versions or {}).items()},
+                "reloads": self.reloads, "errors": self.errors}
+
+
+class BodyCache:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._items: "OrderedDict[tuple, Tuple[bytes, str, Optional[str]]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key) -> Optional[Tuple[bytes, str, Optional[str]]]:
+        """``(body, mimetype, content_encoding)`` stored under ``key``, or None."""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item
+
+    def put(self, key, body: bytes, mimetype: str, encoding: Optional[str]):
+        if len(body) > self.max_bytes // 4:
+            return                          # one huge body would evict everything else
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._size -= len(old[0])
+            self._items[key] = (body, mimetype, encoding)
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, (evicted, _, _) = self._items.popitem(last=False)
+                self._size -= len(evicted)
+
+    def stats(self) -> dict:
+        return {"entries": len(self._items), "bytes": self._size, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,131 @@
+"""Cheap counters for the ingest and fan-out path.
+
+Every thread that calls ``record`` (one per upstream shard, or the relay
+thread) gets its own ``_ThreadStats`` through a ``threading.local``, so the
+hot path only bumps plain ints in objects no other thread writes, with no
+lock and no shared cache line ping-pong between shards. Timings go into
+log2 histograms (bucket ``b`` counts values in ``[2^(b-1), 2^b)``), which
+cost one ``int.bit_length()`` per sample.
+
+``report`` merges the per-thread stats when someone asks. Percentiles are
+bucket upper bounds, so they are accurate to a factor of two, which is
+enough to tell 50µs from 5ms. Tick rates compare the current totals
+with ones remembered from an earlier call, up to ``RATE_WINDOW`` seconds
+back; the first call after start has no history and reports the average
+since start.
+"""
+import threading, time
+from collections import deque
+from typing import Dict, List
+
+BUCKETS = 64
+RATE_WINDOW = 60.0      # seconds of totals kept for the per-second rates
+
+
+def percentiles(hist: List[int], ps=(50, 90, 99)) -> dict:
+    """Upper-bound percentiles (and max) of a log2 histogram."""
+    total = sum(hist)
+    out = {"count": total}
+    if not total:
+        return out
+    for p in ps:
+        need, seen = total * p / 100.0, 0
+        for b, n in enumerate(hist):
+            seen += n
+            if seen >= need:
+                out[f"p{p}"] = (1 << b) - 1 if b else 0
+                break
+    out["max"] = (1 << max(b for b, n in enumerate(hist) if n)) - 1
+    return out
+
+
+def depth_percentiles(depths: List[int], ps=(50, 90, 99)) -> dict:
+    out = {"count": len(depths)}
+    if depths:
+        depths = sorted(depths)
+        for p in ps:
+            out[f"p{p}"] = depths[min(len(depths) - 1, int(len(depths) * p / 100))]
+        out["max"] = depths[-1]
+    return out
+
+
+class _ThreadStats:
+    __slots__ = ("messages", "ticks", "broadcast_ns", "latency_ms")
+
+    def __init__(self):
+        self.messages = 0
+        self.ticks: Dict[str, int] = {}
+        self.broadcast_ns = [0] * BUCKETS
+        self.latency_ms = [0] * BUCKETS
+
+
+class IngestMetrics:
+    def __init__(self):
+        self._local = threading.local()
+        self._threads: List[_ThreadStats] = []
+        self._lock = threading.Lock()         # only taken once per thread and per report
+        self._history = deque()               # (monotonic time, {symbol: total ticks})
+        self.started = time.monotonic()
+
+    def _mine(self) -> _ThreadStats:
+        try:
+            return self._local.stats
+        except AttributeError:
+            st = self._local.stats = _ThreadStats()
+            with self._lock:
+                self._threads.append(st)
+            return st
+
+    def record(self, quotes, broadcast_ns: int, now_ms: int):
+        """Account one upstream message: its ticks, the fan-out time and tick ages."""
+        st = self._mine()
+        st.messages += 1
+        st.broadcast_ns[min(BUCKETS - 1, broadcast_ns.bit_length())] += 1
+        ticks, lat = st.ticks, st.latency_ms
+        for q in quotes:
+            sym = q["symbol"]
+            ticks[sym] = ticks.get(sym, 0) + 1
+            ts = q.get("ts")
+            if ts:
+                lat[min(BUCKETS - 1, max(0, now_ms - ts).bit_length())] += 1
+
+    def report(self) -> dict:
+        with self._lock:
+            threads = list(self._threads)
+        messages = 0
+        totals: Dict[str, int] = {}
+        bcast = [0] * BUCKETS
+        lat = [0] * BUCKETS
+        for st in threads:
+            messages += st.messages
+            for sym, n in dict(st.ticks).items():
+                totals[sym] = totals.get(sym, 0) + n
+            for b in range(BUCKETS):
+                bcast[b] += st.broadcast_ns[b]
+                lat[b] += st.latency_ms[b]
+
+        now = time.monotonic()
+        with self._lock:
+            hist = self._history
+            while hist and now - hist[0][0] > RATE_WINDOW:
+                hist.popleft()
+            ref_t, ref = hist[0] if hist else (self.started, {})
+            if not hist or now - hist[-1][0] >= 1.0:
+                hist.append((now, totals))
+        span = max(now - ref_t, 1e-9)
+        rates = {sym: round((n - ref.get(sym, 0)) / span, 2) for sym, n in totals.items()}
+
+        bus = percentiles(bcast)
+        for k in ("p50", "p90", "p99", "max"):
+            if k in bus:
+                bus[k] = round(bus[k] / 1000.0, 1)
+        return {
+            "uptime_s": round(now - self.started, 1),
+            "messages": messages,
+            "ticks": sum(totals.values()),
+            "ticks_per_sec": round(sum(rates.values()), 2),
+            "rate_window_s": round(span, 1),
+            "symbols": {sym: {"ticks": totals[sym], "per_sec": rates[sym]} for sym in sorted(totals)},
+            "broadcast_us": bus,
+            "upstream_to_emit_ms": percentiles(lat),
+        }
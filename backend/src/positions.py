@@ -0,0 +1,134 @@
+"""User positions: quantity, cost basis and realized P&L per user and company.
+
+``user_positions`` (migration 0004) is updated in the same transaction as
+every trade, using the average-cost method:
+
+* a buy adds its quantity and total price to the position
+* a sell releases ``cost_basis * sold / quantity`` of the cost basis and adds
+  ``proceeds - released`` to ``realized_pnl``
+
+``replay`` applies the same rules to a list of trades. It rebuilds one
+position after a trade is deleted from history, and fills the whole table
+from ``user_trades``. ``migrate.py`` does that when it applies 0004; to
+rebuild by hand:
+
+    python src/positions.py --backfill
+"""
+import os
+from decimal import Decimal
+
+# lock the row so two concurrent sells cannot both pass the holdings check
+SELECT_FOR_SELL = """
+    SELECT quantity FROM user_positions
+    WHERE user_id=%s AND company_id=%s
+    FOR UPDATE
+"""
+
+APPLY_BUY = """
+    INSERT INTO user_positions (user_id, company_id, quantity, cost_basis, realized_pnl, updated_at)
+    VALUES (%(user_id)s, %(company_id)s, %(quantity)s, %(total)s, 0, NOW())
+    ON CONFLICT (user_id, company_id) DO UPDATE
+       SET quantity = user_positions.quantity + EXCLUDED.quantity,
+           cost_basis = user_positions.cost_basis + EXCLUDED.cost_basis,
+           updated_at = NOW()
+"""
+
+# every SET expression sees the old row, so quantity/cost_basis are pre-sale values
+APPLY_SELL = """
+    UPDATE user_positions
+       SET realized_pnl = realized_pnl + %(total)s - cost_basis * %(quantity)s / quantity,
+           cost_basis = CASE WHEN quantity = %(quantity)s THEN 0
+                             ELSE cost_basis - cost_basis * %(quantity)s / quantity END,
+           quantity = quantity - %(quantity)s,
+           updated_at = NOW()
+     WHERE user_id=%(user_id)s AND company_id=%(company_id)s
+"""
+
+UPSERT_POSITION = """
+    INSERT INTO user_positions (user_id, company_id, quantity, cost_basis, realized_pnl, updated_at)
+    VALUES (%s, %s, %s, %s, %s, NOW())
+    ON CONFLICT (user_id, company_id) DO UPDATE
+       SET quantity = EXCLUDED.quantity, cost_basis = EXCLUDED.cost_basis,
+           realized_pnl = EXCLUDED.realized_pnl, updated_at = NOW()
+"""
+
+
+def replay(trades):
+    """``[(trade_type, quantity, total_price), ...]`` in trade order -> (quantity, cost_basis, realized_pnl)."""
+    qty, cost, pnl = Decimal(0), Decimal(0), Decimal(0)
+    for trade_type, quantity, total in trades:
+        quantity, total = Decimal(quantity), Decimal(total)
+        if trade_type == "BUY":
+            qty += quantity
+            cost += total
+        elif qty > 0:
+            sold = min(quantity, qty)       # history may oversell; never go short
+            released = cost * sold / qty
+            pnl += total * sold / quantity - released
+            cost = Decimal(0) if sold == qty else cost - released
+            qty -= sold
+    return qty, cost, pnl
+
+
+def rebuild(cur, user_id: int, company_id: int):
+    """Recompute one position from that user's trades in this company."""
+    cur.execute("""
+        SELECT trade_type, quantity, total_price FROM user_trades
+        WHERE user_id=%s AND company_id=%s
+        ORDER BY trade_timestamp, id
+    """, (user_id, company_id))
+    cur.execute(UPSERT_POSITION, (user_id, company_id, *replay(cur.fetchall())))
+
+
+def fill(conn, cur) -> int:
+    """Rebuild every position from ``user_trades`` inside the caller's transaction.
+
+    Returns the number of positions written. ``migrate.py`` runs this in the
+    same transaction that applies 0004.
+    """
+    cur.execute("LOCK TABLE user_positions IN EXCLUSIVE MODE")   # no trades land mid-rebuild
+    cur.execute("DELETE FROM user_positions")
+    with conn.cursor(name="backfill_trades") as trades:     # server-side: streams any history size
+        trades.itersize = 10_000
+        trades.execute("""
+            SELECT user_id, company_id, trade_type, quantity, total_price FROM user_trades
+            ORDER BY user_id, company_id, trade_timestamp, id
+        """)
+        key, batch, written = None, [], 0
+        for user_id, company_id, trade_type, quantity, total in trades:
+            if (user_id, company_id) != key:
+                if key:
+                    cur.execute(UPSERT_POSITION, (*key, *replay(batch)))
+                    written += 1
+                key, batch = (user_id, company_id), []
+            batch.append((trade_type, quantity, total))
+        if key:
+            cur.execute(UPSERT_POSITION, (*key, *replay(batch)))
+            written += 1
+    return written
+
+
+def backfill(conn) -> int:
+    """``fill`` in a transaction of its own; returns the number of positions written."""
+    with conn:
+        with conn.cursor() as cur:
+            return fill(conn, cur)
+
+
+if __name__ == "__main__":
+    import argparse
+    import psycopg2
+    from dotenv import load_dotenv
+
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--backfill", action="store_true", help="rebuild user_positions from user_trades")
+    args = ap.parse_args()
+    if not args.backfill:
+        ap.error("nothing to do (use --backfill)")
+    load_dotenv()
+    conn = psycopg2.connect(host=os.getenv("DB_HOST"), port=os.getenv("DB_PORT"), user=os.getenv("DB_USER"),
+                            password=os.getenv("DB_PASSWORD"), dbname=os.getenv("DB_NAME"))
+    try:
+        print(f"Rebuilt {backfill(conn)} positions.")
+    finally:
+        conn.close()
@@ -0,0 +1,59 @@
+"""Append-only recordings of raw Finnhub websocket messages.
+
+File layout: the ``MAGIC`` header, then one record per message:
+
+    uint64 receive time (µs since epoch) | uint32 length | raw message bytes
+
+all little-endian. Records are written unmodified, so a replay reproduces
+exactly what ``FinnhubThread.on_message`` saw. A record cut short by a crash
+is ignored when reading.
+"""
+import struct, threading, time
+from typing import Iterator, Tuple
+
+MAGIC = b"FHREC1\n"
+HEADER = struct.Struct("<QI")
+
+
+class TickRecorder:
+    """Appends raw messages to a recording file; safe to call from several threads."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._f = open(path, "ab")
+        if self._f.tell() == 0:
+            self._f.write(MAGIC)
+        self.count = 0
+
+    def record(self, message):
+        if isinstance(message, str):
+            message = message.encode("utf-8")
+        rec = HEADER.pack(time.time_ns() // 1000, len(message)) + message
+        with self._lock:
+            self._f.write(rec)
+            self.count += 1
+
+    def flush(self):
+        with self._lock:
+            self._f.flush()
+
+    def close(self):
+        with self._lock:
+            self._f.close()
+
+
+def read_recording(path: str) -> Iterator[Tuple[int, bytes]]:
+    """Yield ``(receive_time_us, raw_message)`` for every complete record."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a tick recording")
+        while True:
+            head = f.read(HEADER.size)
+            if len(head) < HEADER.size:
+                return
+            ts_us, n = HEADER.unpack(head)
+            payload = f.read(n)
+            if len(payload) < n:
+                return
+            yield ts_us, payload
@@ -0,0 +1,129 @@
+"""Local stand-in for the Finnhub websocket that replays a tick recording.
+
+Speaks the same protocol as ``wss://ws.finnhub.io``: clients connect with any
+``?token=``, send ``{"type":"subscribe","symbol":...}`` messages and receive
+the recorded ``trade`` messages for the symbols they subscribed to. Point the
+app at it with ``FINNHUB_WS_URL=ws://127.0.0.1:8765``.
+
+    python src/replay_server.py ticks.rec                 # real time
+    python src/replay_server.py ticks.rec --speed 10      # 10x
+    python src/replay_server.py ticks.rec --speed 0       # as fast as possible
+"""
+import argparse, asyncio, itertools, json, time
+
+from aiohttp import WSMsgType, web
+
+from recording import read_recording
+
+SUBSCRIBE_GRACE = 0.5       # seconds to collect subscribe messages before replaying
+READ_BATCH = 1024           # records read per trip to the reader thread
+
+
+def _filter(raw: bytes, symbols):
+    """Return the message text restricted to ``symbols``, or None if nothing is left."""
+    msg = json.loads(raw)
+    if msg.get("type") != "trade":
+        return raw.decode("utf-8")
+    data = msg.get("data", [])
+    keep = [t for t in data if t.get("s") in symbols]
+    if not keep:
+        return None
+    if len(keep) == len(data):
+        return raw.decode("utf-8")
+    msg["data"] = keep
+    return json.dumps(msg)
+
+
+async def _read_batches(path: str):
+    """``read_recording`` in batches of ``READ_BATCH``, read in a worker thread.
+
+    Awaiting every batch also hands control back to the event loop at least
+    once per ``READ_BATCH`` records, whether or not any of them were sent.
+    """
+    records = read_recording(path)
+    try:
+        while True:
+            batch = await asyncio.to_thread(list, itertools.islice(records, READ_BATCH))
+            if not batch:
+                return
+            yield batch
+    finally:
+        records.close()
+
+
+async def _replay(ws: web.WebSocketResponse, path: str, speed: float, loop_forever: bool, symbols):
+    sent = 0
+    started = time.monotonic()
+    while True:
+        t0 = None
+        sent_before = sent
+        async for batch in _read_batches(path):
+            for ts_us, raw in batch:
+                if ws.closed:
+                    return sent
+                if speed > 0:
+                    if t0 is None:
+                        t0, wall0 = ts_us, time.monotonic()
+                    delay = (ts_us - t0) / 1e6 / speed - (time.monotonic() - wall0)
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                text = _filter(raw, symbols)
+                if text is not None:
+                    await ws.send_str(text)
+                    sent += 1
+        if not loop_forever:
+            break
+        if sent == sent_before:
+            # nothing in the recording matches: looping would only spin; a new subscribe restarts it
+            print(f"no recorded messages for {sorted(symbols)}, stopping the loop", flush=True)
+            break
+    elapsed = time.monotonic() - started
+    print(f"replayed {sent} messages in {elapsed:.2f}s ({sent / max(elapsed, 1e-9):.0f} msg/s)", flush=True)
+    return sent
+
+
+async def handle(request: web.Request):
+    cfg = request.app["cfg"]
+    ws = web.WebSocketResponse(heartbeat=20)
+    await ws.prepare(request)
+    symbols = set()
+    replay = None
+
+    async def start_after_grace():
+        await asyncio.sleep(SUBSCRIBE_GRACE)
+        await _replay(ws, cfg.recording, cfg.speed, cfg.loop, symbols)
+
+    async for msg in ws:
+        if msg.type != WSMsgType.TEXT:
+            continue
+        try:
+            cmd = json.loads(msg.data)
+        except ValueError:
+            continue
+        if cmd.get("type") == "subscribe":
+            symbols.add(cmd.get("symbol"))
+        elif cmd.get("type") == "unsubscribe":
+            symbols.discard(cmd.get("symbol"))
+        if replay is None or (cfg.loop and replay.done() and cmd.get("type") == "subscribe"):
+            replay = asyncio.create_task(start_after_grace())
+    if replay:
+        replay.cancel()
+    return ws
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("recording")
+    ap.add_argument("--speed", type=float, default=1.0, help="replay speed multiplier, 0 = max")
+    ap.add_argument("--loop", action="store_true", help="start over when the recording ends")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    cfg = ap.parse_args()
+    app = web.Application()
+    app["cfg"] = cfg
+    app.router.add_get("/", handle)
+    web.run_app(app, host=cfg.host, port=cfg.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""JSON encoding shared by every API response and stream frame.
+
+Uses orjson when it is installed (it is in requirements.txt) and the
+standard library otherwise. Both produce the same compact output:
+
+* ``datetime`` / ``date`` -> ISO 8601, exactly what ``.isoformat()`` gives,
+  so handlers return cursor values as they are instead of converting
+  timestamps in a second loop
+* ``Decimal`` -> string, as Flask's default provider always sent it
+
+``rows(cur)`` turns a cursor's result into dicts keyed by column name in a
+single pass. The Flask app installs a JSON provider so ``jsonify`` uses
+``dumps``.
+"""
+import json
+from datetime import date
+from decimal import Decimal
+
+try:
+    import orjson
+except ImportError:         # pure-python fallback, same output
+    orjson = None
+
+
+def _default(o):
+    if isinstance(o, Decimal):
+        return str(o)
+    if isinstance(o, date):     # datetime too; orjson handles both itself
+        return o.isoformat()
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def dumps_std(obj) -> bytes:
+    return json.dumps(obj, default=_default, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+if orjson is not None:
+    _OPTS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj) -> bytes:
+        return orjson.dumps(obj, default=_default, option=_OPTS)
+
+    loads = orjson.loads
+else:
+    dumps = dumps_std
+    loads = json.loads
+
+
+def dumps_text(obj) -> str:
+    """``dumps`` for APIs that want ``str`` (aiohttp's ``json_response``)."""
+    return dumps(obj).decode("utf-8")
+
+
+def rows(cur) -> list:
+    """The cursor's result as ``[{column: value}]``, built straight from the row tuples."""
+    cols = [d[0] for d in cur.description]
+    return [dict(zip(cols, row)) for row in cur.fetchall()]
+
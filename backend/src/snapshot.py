@@ -0,0 +1,62 @@
+"""Pre-serialized, versioned snapshot of the live quote table.
+
+``/prices/now``, ``/stocks/quotes`` and the first frame of every unfiltered
+SSE stream all send the same thing: every latest quote, sorted by symbol.
+Instead of sorting and encoding that per request, ``QuoteSnapshot`` keeps
+the encoded bytes and rebuilds them lazily, at most once per version. The
+feed bumps the version whenever ``latest_quotes`` changes.
+
+Polling endpoints may also accept a snapshot up to ``min_interval_ms`` old,
+which caps rebuilds at one per interval during a burst of trades. The SSE
+snapshot always asks for the current version, because the stream continues
+from there.
+
+The ETag is a hash of the body, so every worker process hands out the same
+tag for the same quotes and a poller that hits another worker still gets
+its ``304``.
+"""
+import hashlib, itertools, threading, time
+from operator import itemgetter
+from typing import Tuple
+
+from serialize import dumps
+
+
+class QuoteSnapshot:
+    def __init__(self, quotes: dict, min_interval_ms: int = 0):
+        self.quotes = quotes
+        self.min_interval = min_interval_ms / 1000.0
+        self._counter = itertools.count(1)
+        self.version = 0
+        self._lock = threading.Lock()
+        # (version, body, etag, built_at) swapped as one tuple so readers need no lock
+        self._built = (-1, b"[]", "", 0.0)
+        self.rebuilds = 0
+
+    def bump(self):
+        """Mark the quote table as changed; safe from any ingest thread."""
+        self.version = next(self._counter)
+
+    def get(self, fresh: bool = False) -> Tuple[bytes, str]:
+        """Return ``(json_body, etag)`` for the sorted quote list."""
+        built = self._built
+        if built[0] == self.version or (not fresh and time.monotonic() - built[3] < self.min_interval):
+            return built[1], built[2]
+        with self._lock:
+            version = self.version
+            if self._built[0] != version:
+                quotes = sorted(list(self.quotes.values()), key=itemgetter("symbol"))
+                body = dumps(quotes)
+                etag = hashlib.blake2b(body, digest_size=8).hexdigest()
+                self._built = (version, body, etag, time.monotonic())
+                self.rebuilds += 1
+            return self._built[1], self._built[2]
+
+    def sse_frame(self, event_id=None) -> bytes:
+        """The ``{"type":"snapshot"}`` SSE frame for an unfiltered client."""
+        body, _ = self.get(fresh=True)
+        data = b'data: {"type":"snapshot","data":' + body + b"}\n\n"
+        return data if event_id is None else b"id: %d\n" % event_id + data
+
+    def stats(self) -> dict:
+        return {"version": self.version, "rebuilds": self.rebuilds}
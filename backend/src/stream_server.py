@@ -0,0 +1,424 @@
+"""Asyncio streaming front end for live prices.
+
+Serves ``/prices/stream`` (SSE) and the in-memory quote endpoints from one
+event loop, so an idle SSE client costs a coroutine and a small buffer
+instead of a blocked OS thread. Trades come from the same ``feed`` ingest
+the Flask app uses; the database-backed API stays on Flask.
+
+    python src/stream_server.py            # listens on STREAM_PORT (5051)
+
+Holding 10k+ clients needs a matching file-descriptor limit (``ulimit -n``).
+
+``/prices/ws`` is a WebSocket variant for bandwidth-sensitive clients. JSON
+text messages carry control traffic; quotes are binary messages made of
+packed 18-byte records (see ``QUOTE_RECORD``) keyed by a symbol id:
+
+    client -> {"op": "subscribe", "symbols": ["AAPL", "BINANCE:BTCUSDT"]}
+    client -> {"op": "unsubscribe", "symbols": ["AAPL"]}
+    server <- {"type": "symbols", "table": {"AAPL": 0, ...}}     once, on connect
+    server <- {"type": "subscribed", "symbols": {"AAPL": 0}}     ids for new symbols
+    server <- <binary> (uint16 symbol_id, float64 price, uint64 ts_ms) * n, little-endian
+
+After a subscribe the latest known quote of each new symbol is sent first.
+``symbols`` must be a list of strings naming symbols the feed ingests; the
+rest are answered with ``{"type": "error", "error": "unknown_symbols"}``
+and never get an id.
+"""
+import asyncio, json, os, queue, struct, threading
+from collections import defaultdict
+
+from aiohttp import WSCloseCode, WSMsgType, web
+
+import columnar
+import feed
+from broadcast import ConflatingSubscriber, KEEPALIVE, Subscriber, parse_event_id, parse_symbols, sse_frame
+from serialize import dumps, dumps_text
+
+STREAM_PORT = int(os.getenv("STREAM_PORT", "5051"))
+KEEPALIVE_SECS = 15
+WS_MAX_PENDING = 4096           # unsent records before a websocket client is cut off
+
+QUOTE_RECORD = struct.Struct("<HdQ")    # symbol_id, price, ts (ms)
+
+SSE_HEADERS = {
+    "Content-Type": "text/event-stream",
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",  # for nginx
+    "Access-Control-Allow-Origin": "*",
+}
+
+
+class LoopWaker:
+    """Wakes subscriber coroutines from the ingest thread.
+
+    Every subscriber the broadcaster touches is collected here and a single
+    ``call_soon_threadsafe`` sets their events, so a tick costs one loop
+    wakeup no matter how many clients it reaches.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self._pending = set()
+        self._scheduled = False
+        self._lock = threading.Lock()
+
+    def wake(self, sub):
+        with self._lock:
+            self._pending.add(sub)
+            if self._scheduled:
+                return
+            self._scheduled = True
+        self.loop.call_soon_threadsafe(self._flush)
+
+    def _flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, set()
+            self._scheduled = False
+        for sub in pending:
+            sub.ready.set()
+
+
+class _LoopBound:
+    """Mixin that signals an asyncio.Event whenever a frame is offered."""
+
+    def bind(self, waker: LoopWaker):
+        self.waker = waker
+        self.ready = asyncio.Event()
+        return self
+
+    def offer(self, frame: bytes, key=None) -> bool:
+        ok = super().offer(frame, key)
+        self.waker.wake(self)       # also wakes dropped subscribers so they close
+        return ok
+
+    def drain(self) -> bytes:
+        chunks = []
+        while True:
+            try:
+                chunks.append(self.get_nowait())
+            except queue.Empty:
+                return b"".join(chunks)
+
+
+class AsyncSubscriber(_LoopBound, Subscriber):
+    pass
+
+
+class AsyncConflatingSubscriber(_LoopBound, ConflatingSubscriber):
+    pass
+
+
+class SymbolTable:
+    """Process-wide, append-only symbol -> uint16 id mapping for binary frames."""
+
+    def __init__(self, symbols=()):
+        self._ids = {}
+        self._lock = threading.Lock()
+        for s in symbols:
+            self.id_for(s)
+
+    def id_for(self, symbol: str) -> int:
+        """Id of ``symbol``, assigned on first use; raises ValueError once all uint16 ids are taken."""
+        sid = self._ids.get(symbol)
+        if sid is None:
+            with self._lock:
+                sid = self._ids.get(symbol)
+                if sid is None:
+                    if len(self._ids) > 0xFFFF:
+                        raise ValueError("symbol table full")
+                    sid = self._ids[symbol] = len(self._ids)
+        return sid
+
+    def snapshot(self) -> dict:
+        return dict(self._ids)
+
+
+class WsClient:
+    """Outbox of one websocket client; only touched on the event loop."""
+
+    def __init__(self):
+        self.symbols = set()
+        self.control = []           # JSON messages, sent before records
+        self.records = []           # packed QUOTE_RECORDs
+        self.ready = asyncio.Event()
+        self.dropped = False
+
+    def send_json(self, obj):
+        self.control.append(obj)
+        self.ready.set()
+
+    def push(self, record: bytes):
+        if len(self.records) >= WS_MAX_PENDING:
+            self.dropped = True
+        else:
+            self.records.append(record)
+
+
+class WsFanout:
+    """Packs each quote once on the ingest thread and hands it to subscribed clients.
+
+    A whole message worth of quotes crosses into the event loop with one
+    ``call_soon_threadsafe``; the symbol index is owned by the loop.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, table: SymbolTable):
+        self.loop = loop
+        self.table = table
+        self._by_symbol = defaultdict(set)
+
+    def on_quotes(self, quotes):
+        # ingest thread: skip symbols nobody is watching over websocket
+        watched = self._by_symbol
+        packed = [(q["symbol"], self.pack(q)) for q in quotes if q["symbol"] in watched]
+        if packed:
+            self.loop.call_soon_threadsafe(self._deliver, packed)
+
+    def pack(self, quote: dict) -> bytes:
+        return QUOTE_RECORD.pack(self.table.id_for(quote["symbol"]), quote["price"], quote.get("ts") or 0)
+
+    def _deliver(self, packed):
+        touched = set()
+        for sym, record in packed:
+            for client in self._by_symbol.get(sym, ()):
+                client.push(record)
+                touched.add(client)
+        for client in touched:
+            client.ready.set()
+
+    def subscribe(self, client: WsClient, symbols):
+        new = set(symbols) - client.symbols
+        client.symbols |= new
+        for s in new:
+            self._by_symbol[s].add(client)
+        return new
+
+    def unsubscribe(self, client: WsClient, symbols):
+        for s in set(symbols) & client.symbols:
+            client.symbols.discard(s)
+            watchers = self._by_symbol.get(s)
+            if watchers is not None:
+                watchers.discard(client)
+                if not watchers:
+                    del self._by_symbol[s]
+
+    def remove(self, client: WsClient):
+        self.unsubscribe(client, list(client.symbols))
+
+
+def _sorted_quotes(wants=None):
+    quotes = feed.latest_quotes.values()
+    if wants is not None:
+        quotes = [q for q in quotes if wants(q["symbol"])]
+    return sorted(quotes, key=lambda x: x["symbol"])
+
+
+def _json(obj, status: int = 200) -> web.Response:
+    return web.Response(body=dumps(obj), status=status, content_type="application/json")
+
+
+# ---- routes ----
+async def prices_stream(request: web.Request):
+    symbols = parse_symbols(request.query.get("symbols"))
+    conflate = request.query.get("conflate", "1" if feed.STREAM_CONFLATE else "0") == "1"
+    if conflate:
+        sub = AsyncConflatingSubscriber(symbols)
+    else:
+        sub = AsyncSubscriber(feed.hub.maxsize, symbols)
+    sub.bind(request.app["waker"])
+
+    last_id = parse_event_id(request.headers.get("Last-Event-ID") or request.query.get("lastEventId"))
+
+    resp = web.StreamResponse(headers=SSE_HEADERS)
+    await resp.prepare(request)
+    feed.hub.add(sub, last_id)
+    try:
+        if sub.backlog is not None:
+            await resp.write(b"".join(sub.backlog))
+        elif symbols is None:
+            await resp.write(feed.snapshot.sse_frame(sub.last_id))
+        else:
+            await resp.write(sse_frame({"type": "snapshot", "data": _sorted_quotes(sub.wants)}, sub.last_id))
+        while not sub.dropped:
+            try:
+                await asyncio.wait_for(sub.ready.wait(), KEEPALIVE_SECS)
+            except asyncio.TimeoutError:
+                await resp.write(KEEPALIVE)
+                continue
+            sub.ready.clear()
+            # one write for everything queued since the last wakeup
+            chunk = sub.drain()
+            if chunk:
+                await resp.write(chunk)
+    except ConnectionResetError:
+        pass
+    finally:
+        feed.hub.unsubscribe(sub)
+    return resp
+
+
+def _ws_subscribe(fanout: WsFanout, client: WsClient, symbols):
+    # only symbols the feed ingests get an id; anything else would grow the shared table forever
+    known = set(feed.symbols())
+    unknown = sorted(set(symbols) - known)
+    if unknown:
+        client.send_json({"type": "error", "error": "unknown_symbols", "symbols": unknown})
+    try:
+        ids = {s: fanout.table.id_for(s) for s in sorted(set(symbols) & known)}
+    except ValueError:
+        client.send_json({"type": "error", "error": "symbol_table_full"})
+        return
+    new = fanout.subscribe(client, ids)
+    client.send_json({"type": "subscribed", "symbols": {s: ids[s] for s in sorted(new)}})
+    for s in new:
+        q = feed.latest_quotes.get(s)
+        if q:
+            client.push(fanout.pack(q))
+
+
+async def _ws_writer(ws: web.WebSocketResponse, client: WsClient):
+    while not ws.closed:
+        await client.ready.wait()
+        client.ready.clear()
+        if client.dropped:
+            await ws.close(code=WSCloseCode.TRY_AGAIN_LATER, message=b"client too slow")
+            return
+        control, client.control = client.control, []
+        for obj in control:
+            await ws.send_json(obj, dumps=dumps_text)
+        if client.records:
+            chunk, client.records = b"".join(client.records), []
+            await ws.send_bytes(chunk)
+
+
+async def prices_ws(request: web.Request):
+    ws = web.WebSocketResponse(heartbeat=20)
+    await ws.prepare(request)
+    fanout = request.app["ws_fanout"]
+    client = WsClient()
+    client.send_json({"type": "symbols", "table": fanout.table.snapshot()})
+    initial = parse_symbols(request.query.get("symbols"))
+    if initial:
+        _ws_subscribe(fanout, client, initial)
+    writer = asyncio.create_task(_ws_writer(ws, client))
+    try:
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                continue
+            try:
+                cmd = json.loads(msg.data)
+                op = cmd.get("op")
+                raw = cmd.get("symbols", [])
+                if not isinstance(raw, list) or not all(isinstance(x, str) for x in raw):
+                    raise TypeError("symbols must be a list of strings")
+                symbols = {x.strip().upper() for x in raw if x.strip()}
+            except (ValueError, AttributeError, TypeError):
+                client.send_json({"type": "error", "error": "bad_message"})
+                continue
+            if op == "subscribe":
+                _ws_subscribe(fanout, client, symbols)
+            elif op == "unsubscribe":
+                fanout.unsubscribe(client, symbols)
+                client.send_json({"type": "unsubscribed", "symbols": sorted(symbols)})
+            else:
+                client.send_json({"type": "error", "error": "unknown_op", "op": op})
+    finally:
+        fanout.remove(client)
+        writer.cancel()
+    return ws
+
+
+def _snapshot_response(request: web.Request):
+    body, etag = feed.snapshot.get()
+    if any(t.value == etag for t in request.if_none_match or ()):
+        return web.Response(status=304, headers={"ETag": f'"{etag}"'})
+    resp = web.Response(body=body, content_type="application/json", headers={"Cache-Control": "no-cache"})
+    resp.etag = etag
+    return resp
+
+
+async def prices_now(request: web.Request):
+    return _snapshot_response(request)
+
+
+async def list_live_quotes(request: web.Request):
+    return _snapshot_response(request)
+
+
+async def get_live_quote(request: web.Request):
+    sym = request.match_info["symbol"].upper().strip()
+    q = feed.latest_quotes.get(sym)
+    if q:
+        return _json(q)
+    return _json({"error": "quote_not_available", "symbol": sym}, status=404)
+
+
+async def get_live_candles(request: web.Request):
+    sym = request.match_info["symbol"].upper().strip()
+    interval = request.query.get("interval", "1m")
+    fmt = request.query.get("format", "rows")
+    if fmt not in columnar.FORMATS:
+        return _json({"error": f"format must be one of {', '.join(columnar.FORMATS)}"}, status=400)
+    try:
+        limit = int(request.query.get("limit", 300))
+        since = int(request.query["since"]) if request.query.get("since") else None
+        if fmt == "rows":
+            bars = feed.candles.bars(sym, interval, limit, since)
+        else:
+            bars = feed.candles.columns(sym, interval, limit, since)
+    except ValueError:
+        return _json({"error": "limit and since must be integers"}, status=400)
+    except KeyError:
+        return _json({"error": "unknown_interval", "intervals": list(feed.candles.intervals)}, status=400)
+    if fmt == "binary":
+        return web.Response(body=columnar.pack(bars, ints=("t",)), content_type="application/octet-stream")
+    if fmt == "columnar":
+        return _json({"symbol": sym, "interval": interval, **bars})
+    return _json({"symbol": sym, "interval": interval, "bars": bars})
+
+
+async def health(request: web.Request):
+    return _json({
+        "status": "ok",
+        "symbols": feed.symbols(),
+        "live_count": len(feed.latest_quotes),
+        "keys": list(feed.latest_quotes.keys()),
+        "stream": feed.hub.stats(),
+        "candles": feed.candles.stats(),
+        "snapshot": feed.snapshot.stats(),
+        "tick_writer": feed.writer.stats() if feed.writer else None,
+    })
+
+
+async def metrics(request: web.Request):
+    return _json(feed.metrics_report())
+
+
+async def _on_startup(app: web.Application):
+    loop = asyncio.get_running_loop()
+    app["waker"] = LoopWaker(loop)
+    app["ws_fanout"] = WsFanout(loop, SymbolTable(feed.symbols()))
+    feed.add_quote_listener(app["ws_fanout"].on_quotes)
+    feed.start()
+
+
+async def _on_cleanup(app: web.Application):
+    feed.stop()
+
+
+def create_app() -> web.Application:
+    app = web.Application()
+    app.router.add_get("/prices/stream", prices_stream)
+    app.router.add_get("/prices/ws", prices_ws)
+    app.router.add_get("/prices/now", prices_now)
+    app.router.add_get("/stocks/quotes", list_live_quotes)
+    app.router.add_get("/stocks/quote/{symbol}", get_live_quote)
+    app.router.add_get("/stocks/candles/{symbol}", get_live_candles)
+    app.router.add_get("/health", health)
+    app.router.add_get("/metrics", metrics)
+    app.on_startup.append(_on_startup)
+    app.on_cleanup.append(_on_cleanup)
+    return app
+
+
+if __name__ == "__main__":
+    web.run_app(create_app(), host="0.0.0.0", port=STREAM_PORT, backlog=4096)
@@ -0,0 +1,132 @@
+"""Persist live ticks to Postgres in batches with ``COPY``.
+
+``TickWriter.add`` is a quote listener: it only appends to an in-memory
+buffer and never touches the database, so the websocket callback cannot
+block on DB I/O. A background thread flushes the buffer with one ``COPY``
+per batch, either when ``batch`` rows are pending or every ``flush_ms``.
+
+The buffer is bounded by ``max_pending``. If the database falls behind or is
+down, failed batches go back to the front of the buffer and are retried with
+backoff. Once the buffer is full, new ticks are dropped and counted in
+``dropped`` rather than stalling ingest or growing memory without limit.
+"""
+import io, os, threading, time
+from datetime import datetime, timezone
+
+import psycopg2
+
+COPY_SQL = "COPY intraday_ticks (symbol, trade_timestamp, price, volume) FROM STDIN"
+NULL = "\\N"
+
+
+def connect():
+    port = os.getenv("DB_PORT")
+    return psycopg2.connect(host=os.getenv("DB_HOST"), port=int(port) if port else None,
+                            user=os.getenv("DB_USER"), password=os.getenv("DB_PASSWORD"),
+                            dbname=os.getenv("DB_NAME"))
+
+
+# backslash, tab and newlines are field/row syntax in COPY text format
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def _copy_rows(rows) -> io.StringIO:
+    """Rows as COPY text format; timestamps are UTC like the rest of the feed."""
+    buf = io.StringIO()
+    for sym, ts, price, vol in rows:
+        when = datetime.fromtimestamp(ts / 1000, tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")
+        vol = NULL if vol is None else repr(float(vol))
+        buf.write(f"{str(sym).translate(_COPY_ESCAPES)}\t{when}\t{float(price)!r}\t{vol}\n")
+    buf.seek(0)
+    return buf
+
+
+class TickWriter(threading.Thread):
+    """Background batch writer; feed it with ``add(quotes)``."""
+
+    def __init__(self, connect=connect, batch: int = 5000, flush_ms: int = 1000, max_pending: int = 200_000):
+        super().__init__(daemon=True, name="tick-writer")
+        self.connect = connect
+        self.batch = batch
+        self.interval = flush_ms / 1000.0
+        self.max_pending = max_pending
+        self._pending = []
+        self._cv = threading.Condition()
+        self._stopping = False
+        self._conn = None
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self.last_error = None
+
+    def add(self, quotes):
+        rows = [(q["symbol"], q["ts"], q["price"], q.get("volume")) for q in quotes if q.get("ts") is not None]
+        with self._cv:
+            room = self.max_pending - len(self._pending)
+            if len(rows) > room:
+                self.dropped += len(rows) - max(room, 0)
+                rows = rows[:max(room, 0)]
+            self._pending.extend(rows)
+            if len(self._pending) >= self.batch:
+                self._cv.notify()
+
+    def run(self):
+        attempt = 0
+        while True:
+            with self._cv:
+                if not self._stopping and len(self._pending) < self.batch:
+                    self._cv.wait(self.interval)
+                if not self._pending:
+                    if self._stopping:
+                        break
+                    continue
+                rows = self._pending[:self.batch]
+                del self._pending[:self.batch]
+            if self._write(rows):
+                attempt = 0
+                continue
+            with self._cv:
+                # put the batch back in front; the oldest rows go if that overflows
+                self._pending[:0] = rows
+                over = len(self._pending) - self.max_pending
+                if over > 0:
+                    del self._pending[:over]
+                    self.dropped += over
+                if self._stopping:
+                    break
+                self._cv.wait(min(30.0, 0.5 * 2 ** attempt))
+            attempt += 1
+        self._close()
+
+    def _write(self, rows) -> bool:
+        try:
+            if self._conn is None:
+                self._conn = self.connect()
+            with self._conn, self._conn.cursor() as cur:
+                cur.copy_expert(COPY_SQL, _copy_rows(rows))
+            self.written += len(rows)
+            return True
+        except (psycopg2.Error, OSError) as e:
+            self.errors += 1
+            self.last_error = f"{time.strftime('%H:%M:%S')} {e}".strip()
+            self._close()
+            return False
+
+    def _close(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except psycopg2.Error:
+                pass
+            self._conn = None
+
+    def stop(self, timeout: float = 5.0):
+        """Flush what is pending and stop; gives up at the first batch that fails."""
+        with self._cv:
+            self._stopping = True
+            self._cv.notify()
+        self.join(timeout)
+
+    def stats(self) -> dict:
+        return {"pending": len(self._pending), "written": self.written, "dropped": self.dropped,
+                "errors": self.errors, "last_error": self.last_error}
@@ -24,7 +24,9 @@ export default function SymbolPricePage() {
 		setLoading(true);
 		setError("");
 		try {
-			const url = `${API_BASE}/stocks/prices/${symbol}?days=${days}&limit=500`;
+			// Long ranges come back as weekly bars; the server thins either to ~300 points
+			const interval = days > 365 ? "1w" : "1d";
+			const url = `${API_BASE}/stocks/prices/${symbol}?days=${days}&interval=${interval}&points=300`;
 			const res = await fetch(url);
 			if (!res.ok) throw new Error(`Failed to fetch prices for ${symbol}`);
 			const json = await res.json();
@@ -104,6 +106,7 @@ export default function SymbolPricePage() {
 		{ label: "3M", days: 90 },
 		{ label: "6M", days: 180 },
 		{ label: "1Y", days: 365 },
+		{ label: "5Y", days: 1825 },
 	];
 
 	// Live quote state
@@ -38,6 +38,7 @@ export default function ProfilePage() {
   const [user, setUser] = useState<User | null>(null);
   const [balances, setBalances] = useState<UserBalance[]>([]);
   const [trades, setTrades] = useState<Trade[]>([]);
+  const [tradesCursor, setTradesCursor] = useState<string | null>(null);
   const [error, setError] = useState("");
   const [success, setSuccess] = useState("");
   const [loading, setLoading] = useState(true);
@@ -94,6 +95,7 @@ export default function ProfilePage() {
           if (tradeRes.ok) {
             const tradeData = await tradeRes.json();
             setTrades(Array.isArray(tradeData) ? tradeData : tradeData.trades || []);
+            setTradesCursor(tradeData.next_cursor || null);
           }
         } catch (e) {
           console.log("Trades endpoint not available yet");
@@ -111,6 +113,22 @@ export default function ProfilePage() {
     fetchUserData();
   }, [token, router, dataVersion]);
 
+  // Fetch the next (older) page of trades
+  const handleLoadMoreTrades = async () => {
+    if (!token || !tradesCursor) return;
+    try {
+      const res = await fetch(`${API_BASE}/user/trades?before=${encodeURIComponent(tradesCursor)}`, {
+        headers: { Authorization: `Bearer ${token}` },
+      });
+      if (!res.ok) throw new Error("Failed to load trades");
+      const data = await res.json();
+      setTrades((prev) => [...prev, ...(data.trades || [])]);
+      setTradesCursor(data.next_cursor || null);
+    } catch (e) {
+      setError(e instanceof Error ? e.message : "Failed to load trades");
+    }
+  };
+
   // Handle profile update
   const handleUpdateProfile = async (e: React.FormEvent) => {
     e.preventDefault();
@@ -602,6 +620,24 @@ export default function ProfilePage() {
             </table>
           </div>
         )}
+        {tradesCursor && (
+          <div style={{ marginTop: 12, textAlign: "center" }}>
+            <button
+              onClick={handleLoadMoreTrades}
+              style={{
+                padding: "8px 16px",
+                borderRadius: 6,
+                border: `1px solid ${colors.primary}`,
+                background: colors.primaryLight,
+                color: colors.primary,
+                cursor: "pointer",
+                fontWeight: 600,
+              }}
+            >
+              Load more
+            </button>
+          </div>
+        )}
       </section>
 
       {/* Back button */}
@@ -0,0 +1,61 @@
+"""Benchmark: cost of fanning one live tick out to N SSE subscribers.
+
+Compares the old path (raw dict in every queue, each client generator runs
+``json.dumps`` and builds its own frame) with the encode-once path in
+``backend/src/broadcast.py``.
+
+    python scripts/bench_broadcast.py --ticks 2000 --subs 1,10,100,1000,2000
+"""
+import argparse, json, os, queue, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend", "src"))
+from broadcast import Broadcaster  # noqa: E402
+
+TICK = {"type": "quote", "symbol": "BINANCE:BTCUSDT", "price": 67321.45, "ts": 1697040000000}
+
+
+def legacy_tick(queues, obj):
+    # old _broadcast + prices_stream generator
+    for q in queues:
+        q.put_nowait(obj)
+    for q in queues:
+        item = q.get_nowait()
+        f"data: {json.dumps(item)}\n\n".encode("utf-8")   # WSGI encodes str bodies per client
+
+
+def shared_tick(hub, queues, obj):
+    hub.publish(obj)
+    for q in queues:
+        q.get_nowait()                                      # generator yields the shared bytes as-is
+
+
+def run(n_subs, ticks):
+    legacy_qs = [queue.Queue(maxsize=1024) for _ in range(n_subs)]
+    t0 = time.perf_counter()
+    for i in range(ticks):
+        legacy_tick(legacy_qs, dict(TICK, ts=TICK["ts"] + i))
+    legacy = (time.perf_counter() - t0) / ticks
+
+    hub = Broadcaster(maxsize=1024)
+    shared_qs = [hub.subscribe() for _ in range(n_subs)]
+    t0 = time.perf_counter()
+    for i in range(ticks):
+        shared_tick(hub, shared_qs, dict(TICK, ts=TICK["ts"] + i))
+    shared = (time.perf_counter() - t0) / ticks
+    return legacy, shared
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--ticks", type=int, default=500)
+    ap.add_argument("--subs", default="1,10,100,500,1000,2000")
+    args = ap.parse_args()
+
+    print(f"{'subs':>6} {'encodes/tick':>14} {'legacy us/tick':>15} {'shared us/tick':>15} {'speedup':>8}")
+    for n in (int(x) for x in args.subs.split(",")):
+        legacy, shared = run(n, args.ticks)
+        print(f"{n:>6} {f'{n} -> 1':>14} {legacy * 1e6:>15.1f} {shared * 1e6:>15.1f} {legacy / shared:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Latency of a DB-backed endpoint under concurrency, to compare pooling on/off.
+
+Start the API twice, once per-request connections and once pooled, and run
+this against each:
+
+    DB_POOL_MAX=0  python backend/src/app.py     # before: psycopg2.connect per request
+    DB_POOL_MAX=10 python backend/src/app.py     # after: pooled
+
+    python scripts/bench_db_pool.py --url http://127.0.0.1:5050/stocks/prices/AAPL -c 16 --duration 20
+"""
+import argparse, threading, time
+import urllib.error, urllib.request
+
+
+def pct(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def worker(url, stop, lat, codes, lock):
+    mine, mycodes = [], {}
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        try:
+            with urllib.request.urlopen(url, timeout=30) as r:
+                r.read()
+                code = r.status
+        except urllib.error.HTTPError as e:
+            code = e.code
+        except OSError:
+            code = "error"
+        mine.append((time.perf_counter() - t0) * 1000)
+        mycodes[code] = mycodes.get(code, 0) + 1
+    with lock:
+        lat.extend(mine)
+        for k, v in mycodes.items():
+            codes[k] = codes.get(k, 0) + v
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--url", default="http://127.0.0.1:5050/stocks/prices/AAPL")
+    ap.add_argument("-c", "--concurrency", type=int, default=16)
+    ap.add_argument("--duration", type=float, default=20)
+    ap.add_argument("--warmup", type=float, default=2)
+    args = ap.parse_args()
+
+    if args.warmup:
+        stop = threading.Event()
+        ts = [threading.Thread(target=worker, args=(args.url, stop, [], {}, threading.Lock()))
+              for _ in range(args.concurrency)]
+        [t.start() for t in ts]
+        time.sleep(args.warmup)
+        stop.set()
+        [t.join() for t in ts]
+
+    lat, codes, lock, stop = [], {}, threading.Lock(), threading.Event()
+    ts = [threading.Thread(target=worker, args=(args.url, stop, lat, codes, lock)) for _ in range(args.concurrency)]
+    t0 = time.perf_counter()
+    [t.start() for t in ts]
+    time.sleep(args.duration)
+    stop.set()
+    [t.join() for t in ts]
+    elapsed = time.perf_counter() - t0
+    print(f"{len(lat)} requests in {elapsed:.1f}s with {args.concurrency} clients: {len(lat) / elapsed:.0f} req/s  status {codes}")
+    print(f"latency ms  p50 {pct(lat, 50):.2f}  p90 {pct(lat, 90):.2f}  p99 {pct(lat, 99):.2f}  max {max(lat, default=float('nan')):.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Micro-benchmark: building the JSON body of a 5,000-bar /stocks/prices/<symbol> response.
+
+Starts from the text values Postgres sends, so the cost of turning NUMERIC
+into ``Decimal`` counts too:
+
+* before       - NUMERIC -> Decimal, ``dict(zip())``, a second loop calling
+                 ``.isoformat()``, Flask's default ``jsonify`` provider
+* after/json   - NUMERIC kept as text, one pass of ``serialize.rows``-style
+                 dicts, ``serialize.dumps`` on the stdlib fallback
+* after/orjson - the same with orjson (what the API uses when it is installed)
+
+All three bodies are checked to decode to the same value.
+
+``--formats`` then compares the ``?format=`` encodings of the same bars:
+body size raw and gzipped, and how long a client takes to decode each one.
+
+    python scripts/bench_json.py --rows 5000 --runs 50
+    python scripts/bench_json.py --rows 252 --formats        # one year of daily bars
+"""
+import argparse, gzip, json, os, statistics, sys, time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend", "src"))
+import columnar  # noqa: E402
+import serialize  # noqa: E402
+from flask import Flask  # noqa: E402
+
+COLS = ["trade_timestamp", "open", "high", "low", "close", "adj_close", "volume"]
+
+
+def wire_rows(n):
+    """Rows as psycopg2 sees them before typecasting: timestamps plus NUMERIC text."""
+    t0 = datetime(2005, 1, 3)
+    out = []
+    for i in range(n):
+        p = 100 + (i % 400) * 0.37
+        out.append((t0 + timedelta(days=i), f"{p:.4f}", f"{p * 1.01:.4f}", f"{p * 0.99:.4f}",
+                    f"{p * 1.002:.4f}", f"{p * 1.002:.4f}", 1_000_000 + i))
+    return out
+
+
+def before(app, wire):
+    rows = [(r[0], *map(Decimal, r[1:6]), r[6]) for r in wire]         # psycopg2's NUMERIC typecaster
+    prices = [dict(zip(COLS, row)) for row in rows]
+    for p in prices:
+        if p.get("trade_timestamp"):
+            p["trade_timestamp"] = p["trade_timestamp"].isoformat()
+    with app.app_context():
+        return app.json.response({"symbol": "AAPL", "prices": prices}).get_data()
+
+
+def after(dumps, wire):
+    prices = [dict(zip(COLS, row)) for row in wire]                     # NUMERIC_AS_TEXT: no cast
+    return dumps({"symbol": "AAPL", "prices": prices})
+
+
+def timed(fn, runs):
+    out = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn()
+        out.append((time.perf_counter() - t0) * 1000)
+    return out
+
+
+def compare_formats(wire, runs):
+    prices = [dict(zip(COLS, row)) for row in wire]
+    bodies = [
+        ("rows (JSON)", serialize.dumps({"symbol": "AAPL", "prices": prices}), serialize.loads),
+        ("columnar (JSON)", serialize.dumps({"symbol": "AAPL", **columnar.bar_columns(wire[::-1])}), serialize.loads),
+        ("binary", columnar.pack(columnar.bar_columns(wire[::-1])), columnar.unpack),
+    ]
+    print(f"formats, {len(wire)} bars")
+    for label, body, decode in bodies:
+        ms = statistics.median(timed(lambda: decode(body), runs))
+        print(f"  {label:<28} {len(body):9,} bytes   gzip {len(gzip.compress(body)):8,} bytes   decode {ms:6.2f} ms")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, default=5000)
+    ap.add_argument("--runs", type=int, default=50)
+    ap.add_argument("--formats", action="store_true", help="compare the ?format= encodings instead")
+    args = ap.parse_args()
+    if args.formats:
+        compare_formats(wire_rows(args.rows), args.runs)
+        return
+
+    app = Flask(__name__)
+    wire = wire_rows(args.rows)
+    results = [("before (Decimal + jsonify)", lambda: before(app, wire)),
+               ("after, stdlib json", lambda: after(serialize.dumps_std, wire))]
+    if serialize.orjson is not None:
+        results.append(("after, orjson", lambda: after(serialize.dumps, wire)))
+
+    bodies = [json.loads(fn()) for _, fn in results]
+    assert all(b == bodies[0] for b in bodies), "encoders disagree"
+
+    print(f"{args.rows} bars, {args.runs} runs each")
+    base = None
+    for label, fn in results:
+        ms = timed(fn, args.runs)
+        med = statistics.median(ms)
+        base = base or med
+        print(f"  {label:<28} median {med:7.2f} ms   min {min(ms):7.2f} ms   {base / med:4.1f}x   {len(fn()):,} bytes")
+
+
+if __name__ == "__main__":
+    main()
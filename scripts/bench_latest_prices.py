@@ -0,0 +1,146 @@
+"""Benchmark /stocks/prices' latest-bar query: MAX()/IN subquery vs latest_prices.
+
+Builds a throwaway schema (``bench_latest`` by default) in the configured
+database with ``--companies`` x ``--bars`` synthetic stock_prices rows
+(default 500 x 20,000 = 10M), the same indexes and latest_prices triggers as
+the migrations, then times both forms of the query. It also times one day of
+new bars inserted with and without the triggers, to show what keeping
+latest_prices current costs the loaders.
+
+    python scripts/bench_latest_prices.py                       # uses DB_* from .env
+    python scripts/bench_latest_prices.py --bars 2000 --keep    # smaller, keep the schema
+
+Generating 10M rows and their index takes a few minutes and ~1.5 GB of disk.
+"""
+import argparse, os, statistics, time
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend", "migrations")
+
+OLD_QUERY = """
+    SELECT c.symbol, c.longName, sp.trade_timestamp, sp.open, sp.high, sp.low, sp.close, sp.adj_close, sp.volume
+    FROM companies c
+    LEFT JOIN (
+        SELECT companies_id, trade_timestamp, open, high, low, close, adj_close, volume
+        FROM stock_prices
+        WHERE (companies_id, trade_timestamp) IN (
+            SELECT companies_id, MAX(trade_timestamp)
+            FROM stock_prices
+            GROUP BY companies_id
+        )
+    ) sp ON c.companies_id = sp.companies_id
+    ORDER BY c.symbol
+"""
+
+NEW_QUERY = """
+    SELECT c.symbol, c.longName, sp.trade_timestamp, sp.open, sp.high, sp.low, sp.close, sp.adj_close, sp.volume
+    FROM companies c
+    LEFT JOIN latest_prices sp ON c.companies_id = sp.companies_id
+    ORDER BY c.symbol
+"""
+
+
+def timed(cur, sql, runs):
+    out = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        cur.execute(sql)
+        cur.fetchall()
+        out.append((time.perf_counter() - t0) * 1000)
+    return out
+
+
+def report(label, ms):
+    print(f"  {label:<28} median {statistics.median(ms):9.2f} ms   min {min(ms):9.2f} ms   ({len(ms)} runs)")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--companies", type=int, default=500)
+    ap.add_argument("--bars", type=int, default=20_000, help="bars per company")
+    ap.add_argument("--runs", type=int, default=10)
+    ap.add_argument("--schema", default="bench_latest")
+    ap.add_argument("--keep", action="store_true", help="keep the schema afterwards")
+    args = ap.parse_args()
+
+    conn = psycopg2.connect(host=os.getenv("DB_HOST"), port=os.getenv("DB_PORT"), user=os.getenv("DB_USER"),
+                            password=os.getenv("DB_PASSWORD"), dbname=os.getenv("DB_NAME"))
+    conn.autocommit = True
+    cur = conn.cursor()
+    s = args.schema
+    try:
+        cur.execute(f"DROP SCHEMA IF EXISTS {s} CASCADE; CREATE SCHEMA {s}; SET search_path = {s}")
+        cur.execute("""
+            CREATE TABLE companies (companies_id SERIAL PRIMARY KEY, longName VARCHAR(255) NOT NULL, symbol VARCHAR(300));
+            CREATE TABLE stock_prices (
+                id SERIAL PRIMARY KEY,
+                companies_id INT NOT NULL REFERENCES companies(companies_id) ON DELETE CASCADE,
+                trade_timestamp TIMESTAMP NOT NULL,
+                open NUMERIC(12,4), high NUMERIC(12,4), low NUMERIC(12,4), close NUMERIC(12,4),
+                adj_close NUMERIC(12,4), volume BIGINT
+            );
+        """)
+        cur.execute("INSERT INTO companies (longName, symbol) SELECT 'Company ' || g, 'SYM' || g FROM generate_series(1, %s) g",
+                    (args.companies,))
+        n = args.companies * args.bars
+        print(f"Generating {n:,} rows …")
+        t0 = time.perf_counter()
+        cur.execute("""
+            INSERT INTO stock_prices (companies_id, trade_timestamp, open, high, low, close, adj_close, volume)
+            SELECT c, TIMESTAMP '2000-01-03' + (d || ' days')::interval,
+                   p, p * 1.01, p * 0.99, p * 1.001, p * 1.001, (random() * 1e6)::bigint
+              FROM generate_series(1, %s) c,
+                   generate_series(0, %s - 1) d,
+                   LATERAL (SELECT (50 + random() * 400)::numeric(12,4) AS p) r
+        """, (args.companies, args.bars))
+        cur.execute("CREATE UNIQUE INDEX stock_prices_company_ts_key ON stock_prices (companies_id, trade_timestamp)")
+        cur.execute("VACUUM ANALYZE stock_prices")
+        print(f"  loaded and indexed in {time.perf_counter() - t0:.0f}s")
+
+        # same table and triggers as backend/migrations/0003_latest_prices.sql
+        with open(os.path.join(MIGRATIONS_DIR, "0003_latest_prices.sql")) as f:
+            migration = f.read()
+        t0 = time.perf_counter()
+        cur.execute(migration)
+        cur.execute("ANALYZE latest_prices")
+        print(f"  latest_prices backfilled in {time.perf_counter() - t0:.1f}s")
+
+        print("Read: latest bar for every company")
+        old = timed(cur, OLD_QUERY, args.runs)
+        new = timed(cur, NEW_QUERY, args.runs)
+        report("MAX()/IN subquery", old)
+        report("latest_prices join", new)
+        print(f"  speed-up {statistics.median(old) / statistics.median(new):.0f}x")
+
+        print("Write: one new bar per company, then delete it again (loader pattern)")
+        day = f"TIMESTAMP '2000-01-03' + interval '{args.bars} days'"
+        ins = f"""INSERT INTO stock_prices (companies_id, trade_timestamp, open, high, low, close, adj_close, volume)
+                  SELECT companies_id, {day}, 100, 101, 99, 100, 100, 1000 FROM companies"""
+        dele = f"DELETE FROM stock_prices WHERE trade_timestamp = {day}"
+        with_trg = []
+        for _ in range(args.runs):
+            t0 = time.perf_counter()
+            cur.execute(ins)
+            cur.execute(dele)
+            with_trg.append((time.perf_counter() - t0) * 1000)
+        cur.execute("ALTER TABLE stock_prices DISABLE TRIGGER USER")
+        without = []
+        for _ in range(args.runs):
+            t0 = time.perf_counter()
+            cur.execute(ins)
+            cur.execute(dele)
+            without.append((time.perf_counter() - t0) * 1000)
+        cur.execute("ALTER TABLE stock_prices ENABLE TRIGGER USER")
+        report("without triggers", without)
+        report("with latest_prices triggers", with_trg)
+    finally:
+        if not args.keep:
+            cur.execute(f"DROP SCHEMA IF EXISTS {s} CASCADE")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Load test for the live price SSE stream.
+
+Opens N concurrent ``/prices/stream`` connections with plain asyncio sockets
+and reports server memory per connection plus fan-out latency:
+
+* spread  - time between the first and the last client receiving the same tick
+* age     - client receive time minus the trade's upstream ``ts``
+
+Only ``--sample`` connections decode frames; the rest just drain bytes, so the
+load generator itself does not become the bottleneck.
+
+Works against the asyncio server (port 5051) and the Flask one (port 5050),
+which makes the thread-per-client cost easy to compare.
+
+    python scripts/loadtest_stream.py --port 5051 -n 10000 --duration 60 --server-pid $(pgrep -f stream_server.py)
+"""
+import argparse, asyncio, json, resource, time
+from collections import defaultdict
+
+
+class Stats:
+    def __init__(self):
+        self.connected = 0
+        self.failed = 0
+        self.frames = 0
+        self.first_seen = {}
+        self.last_seen = {}
+        self.ages = []
+
+    def record(self, quote, now_ms):
+        key = (quote.get("symbol"), quote.get("ts"))
+        self.first_seen.setdefault(key, now_ms)
+        self.last_seen[key] = now_ms
+        if quote.get("ts"):
+            self.ages.append(now_ms - quote["ts"])
+
+
+def rss_kb(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def pct(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+async def sse_client(host, port, path, stats, connect_sem, stop, parse):
+    try:
+        async with connect_sem:
+            reader, writer = await asyncio.open_connection(host, port)
+            # HTTP/1.0 keeps the body unchunked, so frames can be split on blank lines
+            writer.write(f"GET {path} HTTP/1.0\r\nHost: {host}\r\nAccept: text/event-stream\r\n\r\n".encode())
+            await writer.drain()
+            status = await reader.readuntil(b"\r\n\r\n")
+            if b" 200 " not in status.split(b"\r\n", 1)[0]:
+                raise ConnectionError(status[:64])
+    except Exception:
+        stats.failed += 1
+        return
+    stats.connected += 1
+    buf = b""
+    try:
+        while not stop.is_set():
+            chunk = await reader.read(65536)
+            if not chunk:
+                break
+            if not parse:
+                continue
+            now_ms = time.time() * 1000
+            buf += chunk
+            *frames, buf = buf.split(b"\n\n")
+            for frame in frames:
+                if not frame.startswith(b"data: "):
+                    continue
+                stats.frames += 1
+                msg = json.loads(frame[6:])
+                if msg.get("type") == "quote":
+                    stats.record(msg, now_ms)
+                elif msg.get("type") == "quotes":
+                    for q in msg["data"]:
+                        stats.record(q, now_ms)
+    except Exception:
+        pass
+    finally:
+        writer.close()
+
+
+async def main(args):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    path = "/prices/stream" + (f"?symbols={args.symbols}" if args.symbols else "")
+    stats = Stats()
+    stop = asyncio.Event()
+    sem = asyncio.Semaphore(args.connect_concurrency)
+    base_rss = rss_kb(args.server_pid) if args.server_pid else None
+
+    t0 = time.time()
+    tasks = [asyncio.create_task(sse_client(args.host, args.port, path, stats, sem, stop, i < args.sample))
+             for i in range(args.n)]
+    while stats.connected + stats.failed < args.n:
+        await asyncio.sleep(0.5)
+    print(f"connected {stats.connected}/{args.n} ({stats.failed} failed) in {time.time() - t0:.1f}s")
+
+    await asyncio.sleep(2)  # let the server settle before sampling memory
+    if base_rss is not None and stats.connected:
+        rss = rss_kb(args.server_pid)
+        print(f"server RSS {base_rss / 1024:.1f} MiB -> {rss / 1024:.1f} MiB, "
+              f"{(rss - base_rss) / stats.connected:.1f} KiB per connection")
+
+    await asyncio.sleep(args.duration)
+    stop.set()
+    for t in tasks:
+        t.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    spreads = [stats.last_seen[k] - stats.first_seen[k] for k in stats.first_seen]
+    per_sym = defaultdict(int)
+    for sym, _ in stats.first_seen:
+        per_sym[sym] += 1
+    print(f"frames decoded on {min(args.sample, stats.connected)} sampled connections {stats.frames}, distinct ticks {len(stats.first_seen)} across {len(per_sym)} symbols")
+    print(f"fan-out spread ms  p50 {pct(spreads, 50):.1f}  p99 {pct(spreads, 99):.1f}  max {max(spreads, default=float('nan')):.1f}")
+    print(f"tick age ms        p50 {pct(stats.ages, 50):.1f}  p99 {pct(stats.ages, 99):.1f}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=5051)
+    ap.add_argument("-n", type=int, default=1000, help="number of SSE connections")
+    ap.add_argument("--duration", type=float, default=30, help="seconds to hold connections after ramp-up")
+    ap.add_argument("--symbols", default="", help="optional ?symbols= filter")
+    ap.add_argument("--server-pid", type=int, help="server process id, for RSS per connection")
+    ap.add_argument("--sample", type=int, default=100, help="connections that decode frames for latency")
+    ap.add_argument("--connect-concurrency", type=int, default=200)
+    asyncio.run(main(ap.parse_args()))
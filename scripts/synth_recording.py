@@ -0,0 +1,45 @@
+"""Write a synthetic tick recording (random-walk trades in Finnhub's format).
+
+Useful for benchmarking with ``replay_server.py`` when no real recording
+(``FEED_RECORD=...``) is at hand.
+
+    python scripts/synth_recording.py ticks.rec --seconds 60 --rate 200
+"""
+import argparse, json, os, random, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend", "src"))
+from recording import HEADER, MAGIC  # noqa: E402
+
+DEFAULT_SYMBOLS = "AAPL,MSFT,GOOGL,TSLA,BINANCE:BTCUSDT,BINANCE:ETHUSDT,BINANCE:SOLUSDT"
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("out")
+    ap.add_argument("--seconds", type=float, default=60)
+    ap.add_argument("--rate", type=float, default=100, help="upstream messages per second")
+    ap.add_argument("--trades-per-msg", type=int, default=5)
+    ap.add_argument("--symbols", default=DEFAULT_SYMBOLS)
+    args = ap.parse_args()
+
+    rng = random.Random(42)
+    symbols = args.symbols.split(",")
+    prices = {s: rng.uniform(50, 500) for s in symbols}
+    t_us = time.time_ns() // 1000
+    step_us = int(1e6 / args.rate)
+    with open(args.out, "wb") as f:
+        f.write(MAGIC)
+        for _ in range(int(args.seconds * args.rate)):
+            t_us += step_us
+            data = []
+            for _ in range(args.trades_per_msg):
+                s = rng.choice(symbols)
+                prices[s] *= 1 + rng.gauss(0, 0.0005)
+                data.append({"s": s, "p": round(prices[s], 4), "t": t_us // 1000, "v": rng.randint(1, 500), "c": None})
+            msg = json.dumps({"type": "trade", "data": data}).encode("utf-8")
+            f.write(HEADER.pack(t_us, len(msg)) + msg)
+    print(f"wrote {int(args.seconds * args.rate)} messages to {args.out}")
+
+
+if __name__ == "__main__":
+    main()